@@ -1,104 +1,28 @@
+import argparse
 import pygame
-import random
-import sys
 import os
-import math
-import wave
-import struct
-from typing import List, Tuple
-from math import degrees, atan2  # Added degrees import
-
-# Constants
-ASSETS_DIR = "assets"
-if not os.path.exists(ASSETS_DIR):
-    os.makedirs(ASSETS_DIR)
-
-# AudioManager class
-class AudioManager:
-    """
-    Generates tiny WAV tones at runtime so audio always works without internet.
-    """
-    def __init__(self):
-        try:
-            pygame.mixer.pre_init(44100, -16, 2, 512)
-        except Exception:
-            pass
-
-        self._init_ok = False
-        self.sounds = {"eat": None, "power": None, "over": None}
-
-    def init(self):
-        try:
-            if not pygame.get_init():
-                pygame.init()
-            if not pygame.mixer.get_init():
-                pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
-            self._init_ok = True
-        except Exception as e:
-            print(f"[Audio] Mixer unavailable: {e}")
-            self._init_ok = False
-
-        self._prepare_sounds()
-
-    def _prepare_sounds(self):
-        tones = {
-            "eat": [(880, 0.08)],
-            "power": [(660, 0.08), (990, 0.08)],
-            "over": [(330, 0.25), (247, 0.25), (196, 0.25)]
-        }
-        for key, seq in tones.items():
-            path = os.path.join(ASSETS_DIR, f"{key}.wav")
-            self._synthesize_sequence(path, seq)
-            if self._init_ok:
-                try:
-                    self.sounds[key] = pygame.mixer.Sound(path)
-                except Exception as e:
-                    print(f"[Audio] Load failed for {key}: {e}")
-                    self.sounds[key] = None
-
-    @staticmethod
-    def _synthesize_sequence(path: str, sequence: List[Tuple[float, float]], volume: float = 0.35):
-        fr = 44100
-        amp = int(32767 * volume)
-        samples = []
-
-        for freq, dur in sequence:
-            n = int(fr * dur)
-            for i in range(n):
-                t = i / fr
-                s = int(amp * math.sin(2 * math.pi * freq * t))
-                samples.append(s)
-
-        stereo = []
-        for s in samples:
-            stereo.append(s)
-            stereo.append(s)
-
-        with wave.open(path, "wb") as wf:
-            wf.setnchannels(2)
-            wf.setsampwidth(2)
-            wf.setframerate(fr)
-            wf.writeframes(b"".join(struct.pack("<h", v) for v in stereo))
-
-    def play(self, key: str):
-        snd = self.sounds.get(key)
-        if self._init_ok and snd is not None:
-            try:
-                snd.play()
-            except Exception as e:
-                print(f"[Audio] Play failed for {key}: {e}")
+import sys
+import traceback
+
+import engine
+from audio import AudioManager
+from eventlog import LEVELS, log
+from profiler import profiler
+from render import BoardRenderer, SurfaceCache
+from replay import ReplayWriter
+from rewind import RewindBuffer
+from scores import ScoreStore
+from timers import TimerWheel
+from engine import (GRID_WIDTH, GRID_HEIGHT, UP, DOWN, LEFT, RIGHT,
+                    GHOST, SPEED, SCORE_MULTIPLIER)
 
-# Initialize Pygame and Audio
 audio_manager = AudioManager()
-audio_manager.init()
 
-# Set up display
-WIDTH, HEIGHT = 800, 600
+# Display
 GRID_SIZE = 20
-GRID_WIDTH = WIDTH // GRID_SIZE
-GRID_HEIGHT = HEIGHT // GRID_SIZE
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Snake Game")
+WIDTH = GRID_WIDTH * GRID_SIZE
+HEIGHT = GRID_HEIGHT * GRID_SIZE
+SCREEN = None
 
 # Colors
 BLACK = (0, 0, 0)
@@ -112,14 +36,43 @@ BORDER_COLOR = (255, 165, 0)
 GRAY = (100, 100, 100)
 
 # Fonts
-FONT = pygame.font.SysFont("comicsansms", 35)
-SMALL_FONT = pygame.font.SysFont("comicsansms", 20)
+FONT = None
+SMALL_FONT = None
+PROFILE_FONT = None
+
+# Every game is recorded; the last one is kept for bug reports (python replay.py replays/last.snkr)
+REPLAY_DIR = "replays"
+LAST_REPLAY = os.path.join(REPLAY_DIR, "last.snkr")
+
+# Every finished game is added to the leaderboards here (python scores.py lists them)
+SCORES_DB = "scores.db"
+
+# F3 toggles the frame profiler; its timings are written here on exit (python Snake.py --profile starts it on)
+PROFILE_PREFIX = os.path.join("profiles", "profile")
+PROFILE_REFRESH_MS = 500
+
+# Events are written to stderr as they happen; if the game crashes, the last ones
+# (key presses and mouse clicks included) are dumped here
+CRASH_LOG = os.path.join("logs", "crash.log")
 
-# Directions
-UP = (0, -1)
-DOWN = (0, 1)
-LEFT = (-1, 0)
-RIGHT = (1, 0)
+# Rendering runs at FPS; the simulation ticks at the level speed underneath it
+FPS = 60
+MAX_TICKS_PER_FRAME = 5
+
+# Board animations run on frames played (they stop while paused): the background
+# shifts every 6 frames, the border pulses every 30 and flashes for 45 after a level-up
+BG_STEP_FRAMES = 6
+BORDER_PULSE_FRAMES = 30
+LEVEL_FLASH_FRAMES = 45
+
+# Ticks of history kept for rewinding (Backspace while paused or after a game over)
+REWIND_TICKS = 1200
+
+# Boards bigger than the window (python Snake.py --board 2000x2000) scroll with the
+# player, and spawn food, power-ups and obstacles within this many cells of them
+SPAWN_RADIUS = min(GRID_WIDTH, GRID_HEIGHT) // 2
+
+KEY_DIRECTIONS = {pygame.K_UP: UP, pygame.K_DOWN: DOWN, pygame.K_LEFT: LEFT, pygame.K_RIGHT: RIGHT}
 
 # Game states
 MENU = 0
@@ -130,322 +83,348 @@ NEW_GAME = 4
 COLOR_SELECT = 5
 MODE_SELECT = 6
 
-# Power-up types
-GHOST = 0
-SPEED = 1
-SCORE_MULTIPLIER = 2
-
-class Snake:
-    def __init__(self, start_pos, color, controls="user"):
-        self.body = [start_pos]
-        self.direction = RIGHT
-        self.color = color
-        self.score = 0
-        self.controls = controls
-        self.power_up = None
-        self.power_up_timer = 0
-
-    def move(self, direction, food, obstacles, other_snake, game):
-        try:
-            self.direction = direction
-            head = self.body[0]
-            new_head = (head[0] + direction[0], head[1] + direction[1])
-
-            if (new_head[0] < 0 or new_head[0] >= GRID_WIDTH or
-                new_head[1] < 0 or new_head[1] >= GRID_HEIGHT or
-                new_head in obstacles or
-                (other_snake and new_head in other_snake.body and self.power_up != GHOST and (other_snake.power_up != GHOST if other_snake else True))):
-                audio_manager.play("over")
-                return True
-
-            if self.power_up != GHOST and new_head in self.body[1:]:
-                audio_manager.play("over")
-                return True
-
-            self.body.insert(0, new_head)
-
-            multiplier = 2 if self.power_up == SCORE_MULTIPLIER else 1
-            if new_head == food:
-                self.score += 10 * game.level * multiplier
-                audio_manager.play("eat")
-                return False
-            else:
-                self.body.pop()
-
-            if game.power_up and new_head == game.power_up:
-                self.power_up = random.choice([GHOST, SPEED, SCORE_MULTIPLIER])
-                self.power_up_timer = pygame.time.get_ticks() + 5000
-                audio_manager.play("power")
-                game.power_up = None
-
-            if self.power_up and pygame.time.get_ticks() > self.power_up_timer:
-                self.power_up = None
-
-            return False
-        except Exception as e:
-            print(f"Error in snake move: {e}")
-            return True
-
-    def ai_move(self, food, obstacles, other_snake):
-        try:
-            head = self.body[0]
-            directions = [UP, DOWN, LEFT, RIGHT]
-            safe_directions = []
-
-            for d in directions:
-                new_head = (head[0] + d[0], head[1] + d[1])
-                if (0 <= new_head[0] < GRID_WIDTH and 0 <= new_head[1] < GRID_HEIGHT and
-                    new_head not in obstacles and new_head not in self.body[1:] and
-                    (not other_snake or new_head not in other_snake.body or self.power_up == GHOST or (other_snake.power_up == GHOST if other_snake else True))):
-                    safe_directions.append(d)
-
-            if not safe_directions:
-                return self.direction
-
-            dx = food[0] - head[0]
-            dy = food[1] - head[1]
-            angle = degrees(atan2(dy, dx))
-            if -45 <= angle < 45:
-                preferred = RIGHT
-            elif 45 <= angle < 135:
-                preferred = DOWN
-            elif 135 <= angle or angle < -135:
-                preferred = LEFT
-            else:
-                preferred = UP
-
-            if preferred in safe_directions and preferred != (-self.direction[0], -self.direction[1]):
-                return preferred
-            return random.choice(safe_directions) if safe_directions else self.direction
-        except Exception as e:
-            print(f"Error in AI move: {e}")
-            return self.direction
-
-class SnakeGame:
-    def __init__(self):
+def init_display():
+    """Initialize pygame, audio, the window and fonts. Nothing happens at import time."""
+    global SCREEN, FONT, SMALL_FONT, PROFILE_FONT
+    audio_manager.init()
+    SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Snake Game")
+    FONT = pygame.font.SysFont("comicsansms", 35)
+    SMALL_FONT = pygame.font.SysFont("comicsansms", 20)
+    PROFILE_FONT = pygame.font.SysFont("monospace", 14)
+
+class SnakeGame(engine.SnakeGame):
+    """
+    Pygame front end: menus, drawing and input on top of the headless engine.
+    """
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, layout=None):
         self.state = MENU
         self.high_score = 0
-        self.level = 1
-        self.speed = 5
         self.player1_color = GREEN
         self.player2_color = BLUE
-        self.obstacles = []
-        self.is_multiplayer = False
-        self.reset()
-
-    def reset(self):
+        self.renderer = BoardRenderer(SCREEN, GRID_SIZE)
+        self.hud_rects = []
+        self.hud_key = None
+        self.partial_rects = []
+        self.alpha = 1.0
+        self.profile_rects = []
+        self.profile_lines = []
+        self.profile_time = 0
+        self.text = SurfaceCache(256)
+        self.overlays = SurfaceCache(16)
+        # What the menu on screen shows (overlay key and profiler text), None during play
+        self.overlay_shown = None
+        self.history = RewindBuffer(REWIND_TICKS)
+        self.scores = None
+        # Set when a game ends; its results are recorded once, when the player leaves it
+        self.result_pending = False
+        large = width > GRID_WIDTH or height > GRID_HEIGHT
+        super().__init__(width, height, spawn_radius=SPAWN_RADIUS if large else None, layout=layout)
+
+    def reset(self, seed=None, level=None):
         try:
-            # P1 is AI, P2 is user in multiplayer mode
-            self.snake1 = Snake((GRID_WIDTH // 2, GRID_HEIGHT // 2), self.player1_color, "ai" if self.is_multiplayer else "user")
-            self.snake2 = Snake((GRID_WIDTH // 4, GRID_HEIGHT // 4), self.player2_color, "user") if self.is_multiplayer else None
-            self.obstacles = self.generate_obstacles()
-            self.food = self.generate_food()
-            self.power_up = None
-            self.speed = 5 + (self.level - 1)
+            self.save_scores()
+            super().reset(seed, level)
+            self.snake1.color = self.player1_color
+            if self.snake2:
+                self.snake2.color = self.player2_color
+            self.bg_phase = 0
             self.bg_color = BLACK
-            self.bg_timer = pygame.time.get_ticks()
+            self.border_width = 5
+            self.border_color = BORDER_COLOR
+            self.flash = None
+            self.effects = TimerWheel()
+            self.effects.every(BG_STEP_FRAMES, self.step_background)
+            self.effects.every(BORDER_PULSE_FRAMES, self.pulse_border)
+            self.recorder = ReplayWriter(self)
         except Exception as e:
-            print(f"Error in reset: {e}")
+            log.error("game", "Error in reset", error=e)
             self.state = MENU
 
-    def generate_food(self):
+    def move(self):
+        self.history.begin(self)
+        game_over = super().move()
+        self.history.commit(self)
+        self.recorder.capture(self)
+        for key in self.drain_events():
+            audio_manager.play(key)
+            if key == "level":
+                self.flash_border()
+        return game_over
+
+    def step_background(self):
+        self.bg_phase = (self.bg_phase + 10) % 255
+        r = self.bg_phase
+        self.bg_color = (r // 5, r // 10, r // 5)
+
+    def pulse_border(self):
+        self.border_width = 12 - self.border_width
+
+    def flash_border(self):
+        """Light the border up for LEVEL_FLASH_FRAMES frames; a new level-up restarts the flash."""
+        if self.flash is not None:
+            self.flash.cancel()
+        self.border_color = WHITE
+        self.flash = self.effects.schedule(LEVEL_FLASH_FRAMES, self.end_flash)
+
+    def end_flash(self):
+        self.border_color = BORDER_COLOR
+        self.flash = None
+
+    def rewind(self, seconds: float = 1.0):
+        """Step back about `seconds` of play and pause there."""
         try:
-            while True:
-                food = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-                if (food not in self.snake1.body and
-                    (not self.snake2 or food not in self.snake2.body) and
-                    food not in self.obstacles):
-                    return food
+            if self.history.rewind(self, max(1, int(self.speed * seconds))):
+                self.recorder.truncate(self)
+                self.alpha = 1.0
+                self.state = PAUSED
         except Exception as e:
-            print(f"Error generating food: {e}")
-            return (GRID_WIDTH // 2, GRID_HEIGHT // 2)
+            log.error("game", "Error in rewind", error=e)
 
-    def generate_power_up(self):
+    def save_replay(self):
         try:
-            if random.random() < 0.15:
-                while True:
-                    power_up = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-                    if (power_up not in self.snake1.body and
-                        (not self.snake2 or power_up not in self.snake2.body) and
-                        power_up != self.food and power_up not in self.obstacles):
-                        return power_up
-            return None
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            self.recorder.save(LAST_REPLAY, self)
         except Exception as e:
-            print(f"Error generating power-up: {e}")
-            return None
-
-    def generate_obstacles(self):
+            log.error("game", "Error saving replay", error=e)
+
+    def save_scores(self):
+        """
+        Queue the results of a finished game, once. Called when the player leaves it,
+        so a game rewound from its game over screen and played on counts only as it
+        finally ended. The store writes them on its own thread.
+        """
+        if self.scores is None or not self.result_pending:
+            return
+        self.result_pending = False
         try:
-            obstacles = []
-            for _ in range(self.level):
-                while True:
-                    obs = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-                    if (obs not in self.snake1.body and
-                        (not self.snake2 or obs not in self.snake2.body) and
-                        (not hasattr(self, 'food') or obs != self.food)):
-                        obstacles.append(obs)
-                        break
-            return obstacles
+            self.scores.record_game(self, "multiplayer" if self.is_multiplayer else "single")
         except Exception as e:
-            print(f"Error generating obstacles: {e}")
-            return []
+            log.error("game", "Error saving scores", error=e)
 
-    def move(self):
+    def load_high_score(self):
+        if self.scores is None:
+            return
         try:
-            game_over = False
-            if self.is_multiplayer:
-                ai_direction = self.snake1.ai_move(self.food, self.obstacles, self.snake2)
-                game_over |= self.snake1.move(ai_direction, self.food, self.obstacles, self.snake2, self)
-                game_over |= self.snake2.move(self.snake2.direction, self.food, self.obstacles, self.snake1, self)
-            else:
-                game_over |= self.snake1.move(self.snake1.direction, self.food, self.obstacles, None, self)
-
-            if self.food in [self.snake1.body[0]] or (self.is_multiplayer and self.snake2 and self.food in [self.snake2.body[0]]):
-                self.food = self.generate_food()
-                self.power_up = self.generate_power_up()
-                if len(self.snake1.body) % 5 == 0 or (self.is_multiplayer and self.snake2 and len(self.snake2.body) % 5 == 0):
-                    self.level += 1
-                    self.speed += 1
-                    self.obstacles = self.generate_obstacles()
-
-            return game_over
+            self.high_score = max(self.scores.best(mode, "user") for mode in ("single", "multiplayer"))
         except Exception as e:
-            print(f"Error in move: {e}")
-            return True
+            log.error("game", "Error loading high score", error=e)
+
+    def player_score(self) -> int:
+        """Best score of the player-steered snakes; the high score counts only these, as the leaderboard does."""
+        return max((snake.score for snake in self.snakes() if snake.controls == "user"), default=0)
+
+    def snake_color(self, snake):
+        return snake.color if snake.power_up != GHOST else YELLOW
+
+    def cell_color(self, pos):
+        """Colour of a single board cell, or None when only the background shows."""
+        if pos == self.power_up:
+            return {GHOST: YELLOW, SPEED: (0, 255, 255), SCORE_MULTIPLIER: PURPLE}.get(self.snake1.power_up or (self.snake2.power_up if self.is_multiplayer and self.snake2 else None), YELLOW)
+        if pos == self.food:
+            return RED
+        if self.grid.is_free(pos) or self.grid.is_blocked(pos):
+            return None
+        snakes = self.snakes()[::-1]
+        if self.grid.occupied[self.grid.index(pos)] == 1:
+            for snake in snakes:
+                if snake.body[0] == pos or snake.body[-1] == pos:
+                    return self.snake_color(snake)
+        # Only reached when segments overlap (ghost), so a body scan is fine here;
+        # the last snake drawn is the one on top
+        for snake in snakes:
+            if pos in snake.body:
+                return self.snake_color(snake)
+        return None
 
     def draw(self):
+        """Draws the frame and returns the screen rects that changed."""
         try:
-            if pygame.time.get_ticks() - self.bg_timer > 100:
-                r = (pygame.time.get_ticks() // 10) % 255
-                self.bg_color = (r // 5, r // 10, r // 5)
-                self.bg_timer = pygame.time.get_ticks()
-            SCREEN.fill(self.bg_color)
-
-            border_width = 5 + (pygame.time.get_ticks() // 500 % 2) * 2
-            pygame.draw.rect(SCREEN, BORDER_COLOR, (0, 0, WIDTH, HEIGHT), border_width)
-
-            for x in range(0, WIDTH, GRID_SIZE):
-                pygame.draw.line(SCREEN, (50, 50, 50), (x, 0), (x, HEIGHT))
-            for y in range(0, HEIGHT, GRID_SIZE):
-                pygame.draw.line(SCREEN, (50, 50, 50), (0, y), (WIDTH, y))
-
-            for i, segment in enumerate(self.snake1.body):
-                color = self.snake1.color if self.snake1.power_up != GHOST else YELLOW
-                pygame.draw.rect(SCREEN, color, (segment[0] * GRID_SIZE, segment[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-            if self.is_multiplayer and self.snake2:
-                for i, segment in enumerate(self.snake2.body):
-                    color = self.snake2.color if self.snake2.power_up != GHOST else YELLOW
-                    pygame.draw.rect(SCREEN, color, (segment[0] * GRID_SIZE, segment[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-            pygame.draw.rect(SCREEN, RED, (self.food[0] * GRID_SIZE, self.food[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-            if self.power_up:
-                color = {GHOST: YELLOW, SPEED: (0, 255, 255), SCORE_MULTIPLIER: PURPLE}.get(self.snake1.power_up or (self.snake2.power_up if self.is_multiplayer and self.snake2 else None), YELLOW)
-                pygame.draw.rect(SCREEN, color, (self.power_up[0] * GRID_SIZE, self.power_up[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-            for obs in self.obstacles:
-                pygame.draw.rect(SCREEN, PURPLE, (obs[0] * GRID_SIZE, obs[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-            score_text = SMALL_FONT.render(f"P1: {self.snake1.score}" + (f"  P2: {self.snake2.score}" if self.is_multiplayer and self.snake2 else "") + f"  Level: {self.level}", True, WHITE)
-            SCREEN.blit(score_text, (10, 10))
-
-            if self.state == PLAYING:
-                pause_text = SMALL_FONT.render("Pause", True, WHITE)
-                pygame.draw.rect(SCREEN, GRAY, (WIDTH - 100, 10, 80, 30))
-                SCREEN.blit(pause_text, (WIDTH - 90, 15))
-
-            if self.state == MENU:
-                self.draw_menu()
-            elif self.state == GAME_OVER:
-                self.draw_game_over()
-            elif self.state == PAUSED:
-                self.draw_paused()
-            elif self.state == NEW_GAME:
-                self.draw_level_select()
-            elif self.state == COLOR_SELECT:
-                self.draw_color_select()
-            elif self.state == MODE_SELECT:
-                self.draw_mode_select()
+            self.renderer.follow(self.focus(), self.width, self.height)
+            overlay = self.overlay_key()
+            if overlay is None:
+                if self.overlay_shown is not None:
+                    # Play resumed: repaint what the menu covered
+                    self.renderer.invalidate()
+                    self.overlay_shown = None
+            else:
+                shown = (overlay, self.profile_time if profiler.enabled else None)
+                if shown == self.overlay_shown and not self.renderer.changed(self):
+                    return []
+                # The menu is translucent, so the board under it is repainted in full
+                # rather than blended over the last copy; this only happens when either changes
+                self.overlay_shown = shown
+                self.renderer.invalidate()
+            rects = self.renderer.draw(self, self.bg_color, self.border_color, self.border_width, PURPLE,
+                                       self.cell_color, self.snake_color)
+
+            # Slide heads in and tails out between ticks; last frame's partial cells go first
+            for rect in self.partial_rects:
+                self.renderer.restore(rect)
+            rects.extend(self.partial_rects)
+            self.partial_rects = []
+            if self.state == PLAYING and self.ticks > 0 and self.alpha < 1:
+                for snake in self.snakes():
+                    color = self.snake_color(snake)
+                    d = snake.direction
+                    if self.renderer.visible(snake.body[0]):
+                        self.partial_rects.append(self.renderer.draw_partial(snake.body[0], color, (-d[0], -d[1]), self.alpha))
+                    tail = snake.last_tail
+                    if tail is not None and self.renderer.visible(tail):
+                        end = snake.body[-1]
+                        edge = (end[0] - tail[0], end[1] - tail[1])
+                        self.partial_rects.append(self.renderer.draw_partial(tail, color, edge, 1 - self.alpha, self.renderer.board))
+            rects.extend(self.partial_rects)
+
+            # The HUD is drawn over the board: redraw it only when its text changes or
+            # the board underneath was repainted, erasing last frame's copy first
+            hud_text = f"P1: {self.snake1.score}" + (f"  P2: {self.snake2.score}" if self.is_multiplayer and self.snake2 else "") + f"  Level: {self.level}"
+            hud_key = (hud_text, self.state == PLAYING)
+            if hud_key != self.hud_key or any(rect.collidelist(self.hud_rects) != -1 for rect in rects):
+                for rect in self.hud_rects:
+                    self.renderer.restore(rect)
+                rects.extend(self.hud_rects)
+                self.hud_rects = [SCREEN.blit(self.text.render(SMALL_FONT, hud_text, WHITE), (10, 10))]
+                if self.state == PLAYING:
+                    self.hud_rects.append(pygame.draw.rect(SCREEN, GRAY, (WIDTH - 100, 10, 80, 30)))
+                    SCREEN.blit(self.text.render(SMALL_FONT, "Pause", WHITE), (WIDTH - 90, 15))
+                rects.extend(self.hud_rects)
+                self.hud_key = hud_key
+
+            # Profiler timings sit over the bottom-left of the board, redrawn every frame
+            for rect in self.profile_rects:
+                self.renderer.restore(rect)
+            rects.extend(self.profile_rects)
+            self.profile_rects = []
+            if profiler.enabled:
+                y = HEIGHT - 10 - 16 * len(self.profile_lines)
+                for line in self.profile_lines:
+                    self.profile_rects.append(SCREEN.blit(line, (10, y)))
+                    y += 16
+                rects.extend(self.profile_rects)
+
+            if overlay is not None:
+                SCREEN.blit(self.overlays.get(overlay, lambda: self.compose_overlay(overlay[0])), (0, 0))
+                self.hud_key = None
+                rects = [SCREEN.get_rect()]
+            return rects
         except Exception as e:
-            print(f"Error in draw: {e}")
-
-    def draw_menu(self):
-        title = FONT.render("Snake Game", True, GREEN)
-        play = SMALL_FONT.render("Play", True, WHITE)
-        new_game = SMALL_FONT.render("New Game", True, WHITE)
-        mode_select = SMALL_FONT.render("Game Mode", True, WHITE)
-        color_select = SMALL_FONT.render("Adjust Colors", True, WHITE)
-        exit_game = SMALL_FONT.render("Exit", True, WHITE)
-        high = SMALL_FONT.render(f"High Score: {self.high_score}", True, WHITE)
-
-        SCREEN.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 20, 200, 40))
-        SCREEN.blit(play, (WIDTH // 2 - play.get_width() // 2, HEIGHT // 2 - 10))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 30, 200, 40))
-        SCREEN.blit(new_game, (WIDTH // 2 - new_game.get_width() // 2, HEIGHT // 2 + 40))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 80, 200, 40))
-        SCREEN.blit(mode_select, (WIDTH // 2 - mode_select.get_width() // 2, HEIGHT // 2 + 90))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 130, 200, 40))
-        SCREEN.blit(color_select, (WIDTH // 2 - color_select.get_width() // 2, HEIGHT // 2 + 140))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 180, 200, 40))
-        SCREEN.blit(exit_game, (WIDTH // 2 - exit_game.get_width() // 2, HEIGHT // 2 + 190))
-        SCREEN.blit(high, (WIDTH // 2 - high.get_width() // 2, HEIGHT // 2 + 240))
-
-    def draw_mode_select(self):
-        title = FONT.render("Select Game Mode", True, GREEN)
-        single = SMALL_FONT.render("Single Player", True, WHITE)
-        multi = SMALL_FONT.render("Multiplayer", True, WHITE)
-
-        SCREEN.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 20, 200, 40))
-        SCREEN.blit(single, (WIDTH // 2 - single.get_width() // 2, HEIGHT // 2 - 10))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 30, 200, 40))
-        SCREEN.blit(multi, (WIDTH // 2 - multi.get_width() // 2, HEIGHT // 2 + 40))
-
-    def draw_level_select(self):
-        title = FONT.render("Select Level", True, GREEN)
-        SCREEN.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
+            log.error("game", "Error in draw", error=e)
+            return []
+
+    def update_profile_lines(self):
+        """Re-render the profiler overlay text, at most every PROFILE_REFRESH_MS."""
+        now = pygame.time.get_ticks()
+        if not profiler.enabled or (self.profile_lines and now - self.profile_time < PROFILE_REFRESH_MS):
+            return
+        self.profile_time = now
+        text = ["phase      p50    p95    p99  (ms)"]
+        for phase, row in profiler.stats().items():
+            text.append(f"{phase:<8}{row['p50']:>7.2f}{row['p95']:>7.2f}{row['p99']:>7.2f}")
+        self.profile_lines = [PROFILE_FONT.render(line, True, WHITE, BLACK) for line in text]
+
+    def toggle_profiler(self):
+        profiler.enabled = not profiler.enabled
+        self.profile_lines = []
+
+    def overlay_key(self):
+        """Everything a menu screen shows, so a composed screen is reused until it changes."""
+        if self.state == MENU:
+            return (MENU, self.high_score)
+        if self.state == GAME_OVER:
+            return (GAME_OVER, self.snake1.score, self.snake2.score if self.is_multiplayer and self.snake2 else None)
+        if self.state == COLOR_SELECT:
+            return (COLOR_SELECT, self.player1_color, self.player2_color, self.is_multiplayer)
+        if self.state in (PAUSED, NEW_GAME, MODE_SELECT):
+            return (self.state,)
+        return None
+
+    def compose_overlay(self, state):
+        surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        {MENU: self.draw_menu, GAME_OVER: self.draw_game_over, PAUSED: self.draw_paused,
+         NEW_GAME: self.draw_level_select, COLOR_SELECT: self.draw_color_select,
+         MODE_SELECT: self.draw_mode_select}[state](surface)
+        return surface
+
+    def draw_menu(self, surface):
+        title = self.text.render(FONT, "Snake Game", GREEN)
+        play = self.text.render(SMALL_FONT, "Play", WHITE)
+        new_game = self.text.render(SMALL_FONT, "New Game", WHITE)
+        mode_select = self.text.render(SMALL_FONT, "Game Mode", WHITE)
+        color_select = self.text.render(SMALL_FONT, "Adjust Colors", WHITE)
+        exit_game = self.text.render(SMALL_FONT, "Exit", WHITE)
+        high = self.text.render(SMALL_FONT, f"High Score: {self.high_score}", WHITE)
+
+        surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 20, 200, 40))
+        surface.blit(play, (WIDTH // 2 - play.get_width() // 2, HEIGHT // 2 - 10))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 30, 200, 40))
+        surface.blit(new_game, (WIDTH // 2 - new_game.get_width() // 2, HEIGHT // 2 + 40))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 80, 200, 40))
+        surface.blit(mode_select, (WIDTH // 2 - mode_select.get_width() // 2, HEIGHT // 2 + 90))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 130, 200, 40))
+        surface.blit(color_select, (WIDTH // 2 - color_select.get_width() // 2, HEIGHT // 2 + 140))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 180, 200, 40))
+        surface.blit(exit_game, (WIDTH // 2 - exit_game.get_width() // 2, HEIGHT // 2 + 190))
+        surface.blit(high, (WIDTH // 2 - high.get_width() // 2, HEIGHT // 2 + 240))
+
+    def draw_mode_select(self, surface):
+        title = self.text.render(FONT, "Select Game Mode", GREEN)
+        single = self.text.render(SMALL_FONT, "Single Player", WHITE)
+        multi = self.text.render(SMALL_FONT, "Multiplayer", WHITE)
+
+        surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 20, 200, 40))
+        surface.blit(single, (WIDTH // 2 - single.get_width() // 2, HEIGHT // 2 - 10))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 + 30, 200, 40))
+        surface.blit(multi, (WIDTH // 2 - multi.get_width() // 2, HEIGHT // 2 + 40))
+
+    def draw_level_select(self, surface):
+        title = self.text.render(FONT, "Select Level", GREEN)
+        surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
         for i in range(1, 6):
-            level_text = SMALL_FONT.render(f"Level {i}", True, WHITE)
-            pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 50 + i * 50, 200, 40))
-            SCREEN.blit(level_text, (WIDTH // 2 - level_text.get_width() // 2, HEIGHT // 2 - 40 + i * 50))
-
-    def draw_color_select(self):
-        title = FONT.render("Adjust Snake Colors", True, GREEN)
-        p1 = SMALL_FONT.render("Player 1", True, self.player1_color)
-        p2 = SMALL_FONT.render("Player 2", True, self.player2_color)
-        done = SMALL_FONT.render("Done", True, WHITE)
+            level_text = self.text.render(SMALL_FONT, f"Level {i}", WHITE)
+            pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 100, HEIGHT // 2 - 50 + i * 50, 200, 40))
+            surface.blit(level_text, (WIDTH // 2 - level_text.get_width() // 2, HEIGHT // 2 - 40 + i * 50))
+
+    def draw_color_select(self, surface):
+        title = self.text.render(FONT, "Adjust Snake Colors", GREEN)
+        p1 = self.text.render(SMALL_FONT, "Player 1", self.player1_color)
+        p2 = self.text.render(SMALL_FONT, "Player 2", self.player2_color)
+        done = self.text.render(SMALL_FONT, "Done", WHITE)
         colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255)]
-        SCREEN.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
-        SCREEN.blit(p1, (WIDTH // 4 - p1.get_width() // 2, HEIGHT // 2 - 50))
+        surface.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 4))
+        surface.blit(p1, (WIDTH // 4 - p1.get_width() // 2, HEIGHT // 2 - 50))
         if self.is_multiplayer:
-            SCREEN.blit(p2, (3 * WIDTH // 4 - p2.get_width() // 2, HEIGHT // 2 - 50))
+            surface.blit(p2, (3 * WIDTH // 4 - p2.get_width() // 2, HEIGHT // 2 - 50))
         for i, color in enumerate(colors):
-            pygame.draw.rect(SCREEN, color, (WIDTH // 4 - 50 + i * 30, HEIGHT // 2, 25, 25))
+            pygame.draw.rect(surface, color, (WIDTH // 4 - 50 + i * 30, HEIGHT // 2, 25, 25))
             if self.is_multiplayer:
-                pygame.draw.rect(SCREEN, color, (3 * WIDTH // 4 - 50 + i * 30, HEIGHT // 2, 25, 25))
-        pygame.draw.rect(SCREEN, GRAY, (WIDTH // 2 - 50, HEIGHT // 2 + 100, 100, 40))
-        SCREEN.blit(done, (WIDTH // 2 - done.get_width() // 2, HEIGHT // 2 + 110))
-
-    def draw_game_over(self):
-        over = FONT.render("Game Over", True, RED)
-        score1 = SMALL_FONT.render(f"Player 1: {self.snake1.score}", True, WHITE)
-        score2 = SMALL_FONT.render(f"Player 2: {self.snake2.score}", True, WHITE) if self.is_multiplayer and self.snake2 else None
-        restart = SMALL_FONT.render("Press R to Restart", True, WHITE)
-        menu = SMALL_FONT.render("Press M for Menu", True, WHITE)
-
-        SCREEN.blit(over, (WIDTH // 2 - over.get_width() // 2, HEIGHT // 4))
-        SCREEN.blit(score1, (WIDTH // 2 - score1.get_width() // 2, HEIGHT // 2))
+                pygame.draw.rect(surface, color, (3 * WIDTH // 4 - 50 + i * 30, HEIGHT // 2, 25, 25))
+        pygame.draw.rect(surface, GRAY, (WIDTH // 2 - 50, HEIGHT // 2 + 100, 100, 40))
+        surface.blit(done, (WIDTH // 2 - done.get_width() // 2, HEIGHT // 2 + 110))
+
+    def draw_game_over(self, surface):
+        over = self.text.render(FONT, "Game Over", RED)
+        score1 = self.text.render(SMALL_FONT, f"Player 1: {self.snake1.score}", WHITE)
+        score2 = self.text.render(SMALL_FONT, f"Player 2: {self.snake2.score}", WHITE) if self.is_multiplayer and self.snake2 else None
+        restart = self.text.render(SMALL_FONT, "Press R to Restart", WHITE)
+        menu = self.text.render(SMALL_FONT, "Press M for Menu", WHITE)
+
+        surface.blit(over, (WIDTH // 2 - over.get_width() // 2, HEIGHT // 4))
+        surface.blit(score1, (WIDTH // 2 - score1.get_width() // 2, HEIGHT // 2))
         if score2:
-            SCREEN.blit(score2, (WIDTH // 2 - score2.get_width() // 2, HEIGHT // 2 + 30))
-        SCREEN.blit(restart, (WIDTH // 2 - restart.get_width() // 2, HEIGHT // 2 + (60 if score2 else 30)))
-        SCREEN.blit(menu, (WIDTH // 2 - menu.get_width() // 2, HEIGHT // 2 + (90 if score2 else 60)))
-
-    def draw_paused(self):
-        paused = FONT.render("Paused", True, BLUE)
-        resume = SMALL_FONT.render("Press P to Resume", True, WHITE)
-        SCREEN.blit(paused, (WIDTH // 2 - paused.get_width() // 2, HEIGHT // 3))
-        SCREEN.blit(resume, (WIDTH // 2 - resume.get_width() // 2, HEIGHT // 2))
+            surface.blit(score2, (WIDTH // 2 - score2.get_width() // 2, HEIGHT // 2 + 30))
+        surface.blit(restart, (WIDTH // 2 - restart.get_width() // 2, HEIGHT // 2 + (60 if score2 else 30)))
+        surface.blit(menu, (WIDTH // 2 - menu.get_width() // 2, HEIGHT // 2 + (90 if score2 else 60)))
+
+    def draw_paused(self, surface):
+        paused = self.text.render(FONT, "Paused", BLUE)
+        resume = self.text.render(SMALL_FONT, "Press P to Resume", WHITE)
+        rewind = self.text.render(SMALL_FONT, "Press Backspace to Rewind", WHITE)
+        surface.blit(paused, (WIDTH // 2 - paused.get_width() // 2, HEIGHT // 3))
+        surface.blit(resume, (WIDTH // 2 - resume.get_width() // 2, HEIGHT // 2))
+        surface.blit(rewind, (WIDTH // 2 - rewind.get_width() // 2, HEIGHT // 2 + 30))
 
     def handle_input(self, event):
         try:
@@ -453,28 +432,15 @@ class SnakeGame:
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
-                print(f"Key pressed: {pygame.key.name(event.key)}")  # Debug key input
+                log.debug("input", "Key pressed", key=pygame.key.name(event.key))
+                if event.key == pygame.K_F3:
+                    self.toggle_profiler()
                 if self.state == PLAYING:
-                    if self.is_multiplayer:
-                        # Control P2 (snake2) with arrow keys
-                        if event.key == pygame.K_UP and self.snake2.direction != DOWN:
-                            self.snake2.direction = UP
-                        elif event.key == pygame.K_DOWN and self.snake2.direction != UP:
-                            self.snake2.direction = DOWN
-                        elif event.key == pygame.K_LEFT and self.snake2.direction != RIGHT:
-                            self.snake2.direction = LEFT
-                        elif event.key == pygame.K_RIGHT and self.snake2.direction != LEFT:
-                            self.snake2.direction = RIGHT
-                    else:
-                        # Control P1 (snake1) in single-player
-                        if event.key == pygame.K_UP and self.snake1.direction != DOWN:
-                            self.snake1.direction = UP
-                        elif event.key == pygame.K_DOWN and self.snake1.direction != UP:
-                            self.snake1.direction = DOWN
-                        elif event.key == pygame.K_LEFT and self.snake1.direction != RIGHT:
-                            self.snake1.direction = LEFT
-                        elif event.key == pygame.K_RIGHT and self.snake1.direction != LEFT:
-                            self.snake1.direction = RIGHT
+                    if event.key in KEY_DIRECTIONS:
+                        # Arrow keys steer P2 (snake2) in multiplayer and P1 (snake1) in single-player;
+                        # turns are queued so quick presses each get their own tick
+                        snake = self.snake2 if self.is_multiplayer else self.snake1
+                        snake.queue_turn(KEY_DIRECTIONS[event.key])
                     if event.key == pygame.K_p:
                         self.state = PAUSED
                     elif event.key == pygame.K_ESCAPE:
@@ -489,12 +455,16 @@ class SnakeGame:
                         self.state = PLAYING
                     elif event.key == pygame.K_m:
                         self.state = MENU
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.rewind()
                 elif self.state == PAUSED:
                     if event.key == pygame.K_p:
                         self.state = PLAYING
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.rewind()
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 pos = event.pos
-                print(f"Mouse clicked at: {pos}")
+                log.debug("input", "Mouse clicked", pos=pos)
                 if self.state == PLAYING:
                     if WIDTH - 100 <= pos[0] <= WIDTH - 20 and 10 <= pos[1] <= 40:
                         self.state = PAUSED
@@ -515,8 +485,7 @@ class SnakeGame:
                 elif self.state == NEW_GAME:
                     for i in range(1, 6):
                         if WIDTH // 2 - 100 <= pos[0] <= WIDTH // 2 + 100 and HEIGHT // 2 - 50 + i * 50 <= pos[1] <= HEIGHT // 2 - 10 + i * 50:
-                            self.level = i
-                            self.reset()
+                            self.reset(level=i)
                             self.state = PLAYING
                 elif self.state == MODE_SELECT:
                     if WIDTH // 2 - 100 <= pos[0] <= WIDTH // 2 + 100:
@@ -541,34 +510,97 @@ class SnakeGame:
                     if WIDTH // 2 - 50 <= pos[0] <= WIDTH // 2 + 50 and HEIGHT // 2 + 100 <= pos[1] <= HEIGHT // 2 + 140:
                         self.state = MENU
         except Exception as e:
-            print(f"Error in handle_input: {e}")
+            log.error("game", "Error in handle_input", error=e)
+
+def board_size(text):
+    """WIDTHxHEIGHT in cells, e.g. 2000x2000."""
+    try:
+        width, height = (int(n) for n in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    if not (1 <= width <= 65535 and 1 <= height <= 65535):
+        raise argparse.ArgumentTypeError("board sides must be between 1 and 65535 cells")
+    return width, height
 
 def main():
+    parser = argparse.ArgumentParser(description="Snake")
+    parser.add_argument("--board", type=board_size, default=(GRID_WIDTH, GRID_HEIGHT),
+                        help=f"board size in cells (default: {GRID_WIDTH}x{GRID_HEIGHT}, the window)")
+    parser.add_argument("--layout", type=int, help="play a precomputed obstacle layout with this seed")
+    parser.add_argument("--profile", action="store_true", help="start with the frame profiler on (F3)")
+    parser.add_argument("--log-level", choices=list(LEVELS), default="info", help="write events at this level and up")
+    args = parser.parse_args(sys.argv[1:])
+    if args.layout is not None and not 0 <= args.layout < 2 ** 32:
+        parser.error("--layout must be between 0 and 4294967295")
+    log.level = LEVELS[args.log_level]
+    scores = None
     try:
-        game = SnakeGame()
+        init_display()
+        game = SnakeGame(*args.board, layout=args.layout)
+        try:
+            scores = ScoreStore(SCORES_DB)
+        except Exception as e:
+            log.error("game", "Error opening scores", error=e)
+        game.scores = scores
+        game.load_high_score()
         clock = pygame.time.Clock()
+        lag = 0.0
+        if args.profile:
+            profiler.enabled = True
 
         while True:
+            elapsed = clock.tick(FPS)
+            frame_started = profiler.start()
+            started = profiler.start()
             for event in pygame.event.get():
                 game.handle_input(event)
+            profiler.stop("input", started)
 
             if game.state == PLAYING:
-                if (game.snake1.power_up == SPEED or (game.is_multiplayer and game.snake2 and game.snake2.power_up == SPEED)):
-                    game.speed = 8 + (game.level - 1)
-                else:
-                    game.speed = 5 + (game.level - 1)
-                if game.move():
-                    if game.snake1.score > game.high_score or (game.is_multiplayer and game.snake2 and game.snake2.score > game.high_score):
-                        game.high_score = max(game.snake1.score, game.snake2.score if game.is_multiplayer and game.snake2 else 0)
-                    game.state = GAME_OVER
-
-            game.draw()
-            pygame.display.flip()
-            clock.tick(game.speed if game.state == PLAYING else 60)
+                game.effects.advance()
+                # Fixed timestep: tick at the level speed however fast frames are drawn
+                lag += elapsed
+                ticks = 0
+                while game.state == PLAYING and lag >= 1000 / game.speed:
+                    lag -= 1000 / game.speed
+                    ticks += 1
+                    started = profiler.start()
+                    game_over = game.move()
+                    profiler.stop("move", started)
+                    if game_over:
+                        game.high_score = max(game.high_score, game.player_score())
+                        game.state = GAME_OVER
+                        game.result_pending = True
+                        game.save_replay()
+                    if ticks == MAX_TICKS_PER_FRAME:
+                        # Too far behind (e.g. the window was dragged); drop the backlog
+                        lag = 0.0
+                game.alpha = min(lag * game.speed / 1000, 1.0)
+            else:
+                lag = 0.0
+
+            game.update_profile_lines()
+            started = profiler.start()
+            rects = game.draw()
+            profiler.stop("draw", started)
+            started = profiler.start()
+            pygame.display.update(rects)
+            profiler.stop("display", started)
+            profiler.stop("frame", frame_started)
     except Exception as e:
-        print(f"Error in main loop: {e}")
+        log.error("game", "Error in main loop", error=e, traceback=traceback.format_exc())
+        log.dump(CRASH_LOG)
         pygame.quit()
         sys.exit()
+    finally:
+        if scores is not None:
+            game.save_scores()
+            scores.close()
+        if profiler:
+            try:
+                log.info("profiler", "Profile written", files=", ".join(profiler.export(PROFILE_PREFIX)))
+            except OSError as e:
+                log.error("profiler", "Error writing profile", error=e)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,311 @@
+from array import array
+from collections import deque
+from heapq import heappop, heappush
+from typing import Tuple
+
+# UP, DOWN, LEFT, RIGHT (same tuples as engine's direction constants)
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+# Default number of BFS node expansions an AI snake may spend per tick
+DEFAULT_BUDGET = 4000
+
+UNREACHED = -1
+
+# Boards with more cells than this keep only the distances searched so far, and the
+# search stops SPARSE_SLACK steps past the snake (or at SPARSE_LIMIT cells), so its
+# cost follows the distance to the food instead of the board size
+SPARSE_CELLS = 1 << 16
+SPARSE_SLACK = 16
+SPARSE_LIMIT = 1 << 14
+
+# Part of the budget held back each tick for the trap check on the chosen move
+ROOM_SHARE = 4
+
+
+class _SparseField(dict):
+    """Distance field of the cells reached so far; every other cell reads UNREACHED."""
+    def __missing__(self, cell):
+        return UNREACHED
+
+
+class PathPlanner:
+    """
+    Plans moves for one AI snake with BFS over the occupancy grid.
+
+    A distance field from the food is cached and only recomputed when the food
+    moves or the path it describes gets blocked. A BFS that runs out of budget is
+    resumed on the next tick. Before committing to a move the planner floods from
+    the new head to make sure the tail (or enough room for the body) is still
+    reachable, so the snake does not trap itself.
+
+    On large boards the field is cut off around the food (see SPARSE_LIMIT). A
+    snake outside it is not a reason to search again: it walks a path found by a
+    bounded A* from its head toward the food, which ends where the field takes
+    over (or, when the budget runs out first, at the cell nearest the food), and
+    follows that path on later ticks while it stays open.
+
+    A finished field is never written to again (a resumed search extends a copy),
+    so `memento` can share it with snapshots instead of copying it every tick, and
+    planners moving on the same tick can share it with each other (see `choose`).
+    """
+    def __init__(self):
+        self.field = None
+        self.food = None
+        self._frontier = None
+        # Distance at which a sparse search may stop, once it has reached the snake
+        self._stop = None
+        self._targets = ()
+        # Cells still to walk toward a sparse field the snake is outside of
+        self._path = deque()
+        self.recomputes = 0
+        self.cache_hits = 0
+        self._budget = 0
+        # Fields searched this tick by the other planners, and the key for this one's,
+        # which is only shared if it was started this tick rather than resumed
+        self._shared = None
+        self._share_key = None
+        self._fresh = False
+
+    def memento(self):
+        """The planner's cached search state, for snapshots and rewinding."""
+        return (self.field, self.food, tuple(self._frontier) if self._frontier else None, self._stop,
+                tuple(self._path))
+
+    @classmethod
+    def from_memento(cls, memento) -> "PathPlanner":
+        planner = cls()
+        planner.field, planner.food, frontier, planner._stop, path = memento
+        planner._frontier = deque(frontier) if frontier else None
+        planner._path = deque(path)
+        return planner
+
+    def choose(self, grid, body, direction, food, ghost: bool = False,
+               budget: int = DEFAULT_BUDGET, contested=(), shared=None) -> Tuple[int, int]:
+        """
+        Direction for the next move. Cells in `contested` (that another snake's head
+        can also reach this tick) are only taken when nothing else is safe.
+
+        `shared` is a dict passed to every planner choosing on the same tick. A
+        planner that has to search again takes over the field another one already
+        searched (finished, or to carry on with) instead of starting its own.
+        Sparse fields are never shared, as each stops at its own snake.
+        """
+        self._shared = shared if shared is not None and grid.size <= SPARSE_CELLS else None
+        self._share_key = (food, ghost)
+        self._fresh = False
+        # The trap check below always gets its share, however long the searches run
+        reserve = min(budget // ROOM_SHARE, 3 * (len(body) + 2))
+        self._budget = budget - reserve
+        w, h = grid.width, grid.height
+        head = body[0]
+        wall = grid.blocked if ghost else grid.solid
+        reverse = (-direction[0], -direction[1])
+
+        candidates = []
+        for d in DIRECTIONS:
+            x, y = head[0] + d[0], head[1] + d[1]
+            if 0 <= x < w and 0 <= y < h and not wall[y * w + x] and (d != reverse or len(body) == 1):
+                candidates.append((d, y * w + x))
+        if not candidates:
+            return direction
+        if food is None:
+            return candidates[0][0]
+
+        self._targets = {cell for _, cell in candidates}
+        field = self._distance_field(grid, food, wall)
+        sparse = isinstance(self.field, _SparseField)
+        if field is not None:
+            reachable = [c for c in candidates if field[c[1]] != UNREACHED]
+            if reachable:
+                self._path.clear()
+            if (reachable or not sparse) and (
+                    not reachable or not self._path_clear(grid, field, min(reachable, key=lambda c: field[c[1]])[1], wall)):
+                # Bodies or obstacles moved since the field was built
+                self._restart(grid, food, wall)
+                field = self._distance_field(grid, food, wall)
+
+        step = None
+        if sparse and (field is None or all(field[cell] == UNREACHED for _, cell in candidates)):
+            # Outside the field around the food: walk toward it along a path from the head
+            head_cell = head[1] * w + head[0]
+            if self._path and self._path[0] == head_cell:
+                self._path.popleft()
+            if not self._path or self._path[0] not in self._targets:
+                self._path = self._approach(grid, candidates, head_cell, food, field, wall)
+            if self._path:
+                step = self._path[0]
+
+        fx, fy = food
+        def rank(candidate):
+            cell = candidate[1]
+            if cell == step:
+                return -1
+            if field is not None and field[cell] != UNREACHED:
+                return field[cell]
+            return grid.size + abs(cell % w - fx) + abs(cell // w - fy)
+
+        candidates.sort(key=rank)
+        self._budget += reserve
+        tail = body[-1]
+        tail_cell = tail[1] * w + tail[0]
+        best, best_room = candidates[0][0], -1
+        fallback = None
+        for d, cell in candidates:
+            safe, room = self._room(grid, cell, tail_cell, len(body), wall)
+            if safe:
+                if cell not in contested:
+                    return d
+                if fallback is None:
+                    fallback = d
+            if room > best_room:
+                best, best_room = d, room
+        return fallback or best
+
+    def _restart(self, grid, food, wall):
+        if self._shared and self._share_key in self._shared:
+            field, frontier = self._shared[self._share_key]
+            # An unfinished field is carried on in a copy, leaving the one shared alone
+            self.field = array("i", field) if frontier else field
+            self._frontier = deque(frontier)
+            self._stop = None
+            self.food = food
+            self._path = deque()
+            self._fresh = True
+            return
+        self.field = _SparseField() if grid.size > SPARSE_CELLS else array("i", [UNREACHED]) * grid.size
+        self._stop = None
+        start = food[1] * grid.width + food[0]
+        self.field[start] = 0
+        self._frontier = deque([start])
+        self.food = food
+        self._path = deque()
+        self._fresh = True
+        self.recomputes += 1
+
+    def _distance_field(self, grid, food, wall):
+        """Cached BFS distances to the food, or None while the search is still incomplete."""
+        sparse = isinstance(self.field, _SparseField)
+        if self.field is None or self.food != food or (not sparse and len(self.field) != grid.size):
+            self._restart(grid, food, wall)
+            sparse = isinstance(self.field, _SparseField)
+        elif not self._frontier:
+            self.cache_hits += 1
+            return self.field
+        else:
+            self.field = _SparseField(self.field) if sparse else array("i", self.field)
+
+        field, frontier = self.field, self._frontier
+        w = grid.width
+        while frontier:
+            if self._budget <= 0:
+                self._share()
+                return None
+            self._budget -= 1
+            cell = frontier.popleft()
+            dist = field[cell] + 1
+            if sparse:
+                if self._stop is None and cell in self._targets:
+                    self._stop = dist + SPARSE_SLACK
+                if (self._stop is not None and dist > self._stop) or len(field) > SPARSE_LIMIT:
+                    # Every cell nearer the food than the snake is known; that is all it needs
+                    frontier.clear()
+                    break
+            x = cell % w
+            if cell >= w and field[cell - w] == UNREACHED and not wall[cell - w]:
+                field[cell - w] = dist
+                frontier.append(cell - w)
+            if cell < grid.size - w and field[cell + w] == UNREACHED and not wall[cell + w]:
+                field[cell + w] = dist
+                frontier.append(cell + w)
+            if x > 0 and field[cell - 1] == UNREACHED and not wall[cell - 1]:
+                field[cell - 1] = dist
+                frontier.append(cell - 1)
+            if x < w - 1 and field[cell + 1] == UNREACHED and not wall[cell + 1]:
+                field[cell + 1] = dist
+                frontier.append(cell + 1)
+        self._share()
+        return field
+
+    def _share(self):
+        if self._shared is not None and self._fresh:
+            self._shared[self._share_key] = (self.field, tuple(self._frontier))
+
+    def _approach(self, grid, candidates, head_cell, food, field, wall) -> deque:
+        """
+        Bounded A* from the head toward the food (Manhattan distance as the
+        heuristic). Stops at the first cell the field covers, or when the budget
+        runs out, at the cell seen nearest the food; returns the cells to walk.
+        """
+        w = grid.width
+        fx, fy = food
+        def h(cell):
+            return abs(cell % w - fx) + abs(cell // w - fy)
+
+        parent = {head_cell: None}
+        cost = {}
+        heap = []
+        for _, cell in candidates:
+            parent[cell] = head_cell
+            cost[cell] = 1
+            heappush(heap, (1 + h(cell), -1, cell))
+        best = None
+        while heap and self._budget > 0:
+            self._budget -= 1
+            _, g, cell = heappop(heap)
+            g = -g
+            if g > cost[cell]:
+                continue
+            if best is None or h(cell) < h(best):
+                best = cell
+            if field is not None and field[cell] != UNREACHED:
+                best = cell
+                break
+            x = cell % w
+            for nxt in (cell - w, cell + w, cell - 1 if x > 0 else -1, cell + 1 if x < w - 1 else -1):
+                if 0 <= nxt < grid.size and not wall[nxt] and cost.get(nxt, g + 2) > g + 1 and nxt != head_cell:
+                    cost[nxt] = g + 1
+                    parent[nxt] = cell
+                    # Ties go to the deeper cell, so open ground costs about one expansion per step
+                    heappush(heap, (g + 1 + h(nxt), -(g + 1), nxt))
+        path = deque()
+        while best is not None and best != head_cell:
+            path.appendleft(best)
+            best = parent[best]
+        return path
+
+    def _path_clear(self, grid, field, cell, wall) -> bool:
+        """Follow the field downhill from `cell` and check nothing now blocks the way."""
+        w = grid.width
+        while field[cell] > 0:
+            want = field[cell] - 1
+            x = cell % w
+            for nxt in (cell - w, cell + w, cell - 1 if x > 0 else -1, cell + 1 if x < w - 1 else -1):
+                if 0 <= nxt < grid.size and field[nxt] == want and (want == 0 or not wall[nxt]):
+                    cell = nxt
+                    break
+            else:
+                return False
+        return True
+
+    def _room(self, grid, start, tail_cell, length, wall) -> Tuple[bool, int]:
+        """
+        Flood from `start`. Safe if the tail is reachable (it moves out of the way)
+        or there is room for the whole body; also returns the number of cells seen.
+        """
+        w = grid.width
+        seen = {start}
+        frontier = deque([start])
+        while frontier:
+            if self._budget <= 0 or len(seen) > length:
+                return True, len(seen)
+            self._budget -= 1
+            cell = frontier.popleft()
+            x = cell % w
+            for nxt in (cell - w, cell + w, cell - 1 if x > 0 else -1, cell + 1 if x < w - 1 else -1):
+                if 0 <= nxt < grid.size and nxt not in seen:
+                    if nxt == tail_cell:
+                        return True, len(seen)
+                    if not wall[nxt]:
+                        seen.add(nxt)
+                        frontier.append(nxt)
+        return False, len(seen)
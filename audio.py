@@ -0,0 +1,117 @@
+import hashlib
+import math
+import os
+import sys
+from array import array
+from typing import List, Tuple
+
+import pygame
+
+from eventlog import log
+
+ASSETS_DIR = "assets"
+CACHE_DIR = os.path.join(ASSETS_DIR, "cache")
+
+TONES = {
+    "eat": [(880, 0.08)],
+    "power": [(660, 0.08), (990, 0.08)],
+    "over": [(330, 0.25), (247, 0.25), (196, 0.25)],
+    "level": [(523, 0.08), (659, 0.08), (784, 0.12)]
+}
+
+
+class AudioManager:
+    """
+    Generates tiny tones at runtime so audio always works without internet.
+    Samples are built in memory and cached on disk by content hash, so later
+    launches load raw PCM instead of synthesizing again.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self._init_ok = False
+        self.cache_dir = cache_dir
+        self.sounds = {key: None for key in TONES}
+
+    def init(self):
+        try:
+            pygame.mixer.pre_init(44100, -16, 2, 512)
+        except Exception:
+            pass
+
+        try:
+            if not pygame.get_init():
+                pygame.init()
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+            self._init_ok = True
+        except Exception as e:
+            log.warning("audio", "Mixer unavailable", error=e)
+            self._init_ok = False
+
+        if self._init_ok:
+            self._prepare_sounds()
+
+    def _prepare_sounds(self):
+        # Match whatever format the mixer actually opened with
+        rate, _, channels = pygame.mixer.get_init()
+        for key, seq in TONES.items():
+            try:
+                self.sounds[key] = pygame.mixer.Sound(buffer=self.load_pcm(seq, rate, channels))
+            except Exception as e:
+                log.error("audio", "Load failed", sound=key, error=e)
+                self.sounds[key] = None
+
+    def load_pcm(self, sequence: List[Tuple[float, float]], rate: int = 44100, channels: int = 2,
+                 volume: float = 0.35) -> bytes:
+        """16-bit native-endian PCM for `sequence`, from the disk cache when possible."""
+        key = repr((sequence, rate, channels, volume, sys.byteorder)).encode()
+        path = os.path.join(self.cache_dir, hashlib.sha256(key).hexdigest()[:32] + ".pcm")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            pass
+
+        pcm = self._synthesize_sequence(sequence, volume, rate, channels)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("audio", "Could not cache tone", error=e)
+        return pcm
+
+    @staticmethod
+    def _synthesize_sequence(sequence: List[Tuple[float, float]], volume: float = 0.35,
+                             rate: int = 44100, channels: int = 2) -> bytes:
+        amp = int(32767 * volume)
+        counts = [int(rate * dur) for _, dur in sequence]
+
+        # Imported here so a warm cache never pays for numpy at startup
+        try:
+            import numpy as np
+        except ImportError:  # fall back to a plain Python loop
+            np = None
+        if np is not None:
+            freqs = np.repeat([freq for freq, _ in sequence], counts)
+            # Sample index restarts at 0 for every tone, as each one starts at phase 0
+            starts = np.repeat(np.cumsum([0] + counts[:-1]), counts)
+            t = (np.arange(len(freqs)) - starts) / rate
+            samples = (amp * np.sin(2 * np.pi * freqs * t)).astype(np.int16)
+            return np.repeat(samples, channels).tobytes()
+
+        samples = array("h")
+        for (freq, _), n in zip(sequence, counts):
+            for i in range(n):
+                s = int(amp * math.sin(2 * math.pi * freq * (i / rate)))
+                samples.extend([s] * channels)
+        return samples.tobytes()
+
+    def play(self, key: str):
+        snd = self.sounds.get(key)
+        if self._init_ok and snd is not None:
+            try:
+                snd.play()
+            except Exception as e:
+                log.error("audio", "Play failed", sound=key, error=e)
@@ -0,0 +1,294 @@
+import random
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from engine import (GRID_WIDTH, GRID_HEIGHT, UP, DOWN, LEFT, RIGHT,
+                    GHOST, SPEED, SCORE_MULTIPLIER, POWER_UP_TICKS, POWER_UP_WINDOW, WALL, SELF)
+from engine import OBSTACLE as HIT_OBSTACLE
+import levels
+from grid import Grid
+from scores import Run
+
+# Action i moves in ACTIONS[i]
+ACTIONS = (UP, DOWN, LEFT, RIGHT)
+_DX = np.array([d[0] for d in ACTIONS], dtype=np.int64)
+_DY = np.array([d[1] for d in ACTIONS], dtype=np.int64)
+
+NONE = -1
+
+# Observation cell codes
+EMPTY = 0
+BODY = 1
+HEAD = 2
+FOOD = 3
+POWER_UP = 4
+OBSTACLE = 5
+
+
+class BatchSnakeGame:
+    """
+    N single-player games held as struct-of-arrays and advanced together by `step`.
+
+    The rules are those of engine.SnakeGame: game i plays exactly like
+    SnakeGame(width, height, seeds[i], level) driven by the same actions and
+    reset() whenever move() reports game over, so every game starts at `level`. Per-tick movement and collisions
+    are vectorized; rare events (eating, power-up pickup, resets) run per game
+    against the same random.Random stream and free-cell order as the scalar engine.
+
+    `finished` lists the games that ended in the last step, ready for
+    ScoreStore.record_many.
+    """
+    def __init__(self, n: int, width: int = GRID_WIDTH, height: int = GRID_HEIGHT,
+                 seeds: Optional[Sequence[int]] = None, level: int = 1):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.size = width * height
+        seeds = list(seeds) if seeds is not None else list(range(n))
+        if len(seeds) != n:
+            raise ValueError(f"expected {n} seeds, got {len(seeds)}")
+        # Like SnakeGame, every game played gets a fresh seed from its slot's seed stream
+        self.seed_streams = [random.Random(seed) for seed in seeds]
+        self.rngs = [None] * n
+        self.game_seeds = [0] * n
+        self.start_levels = [level] * n
+        self.finished: List[Run] = []
+        self._rows = np.arange(n)
+
+        size = self.size
+        self.occupied = np.zeros((n, size), dtype=np.uint16)
+        self.solid = np.zeros((n, size), dtype=np.uint16)
+        self.blocked = np.zeros((n, size), dtype=np.uint8)
+        self.free = np.zeros((n, size), dtype=np.int32)
+        self.where = np.zeros((n, size), dtype=np.int32)
+        self.free_count = np.zeros(n, dtype=np.int64)
+
+        # Bodies are ring buffers: segment k of game g is body[g, (head_ptr[g] + k) % capacity]
+        self.capacity = size
+        self.body = np.zeros((n, self.capacity), dtype=np.int32)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.full(n, level, dtype=np.int64)
+        self.speed = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.power = np.full(n, NONE, dtype=np.int64)
+        self.power_timer = np.zeros(n, dtype=np.int64)
+        self.food = np.full(n, NONE, dtype=np.int64)
+        self.power_up = np.full(n, NONE, dtype=np.int64)
+        self.power_up_until = np.zeros(n, dtype=np.int64)
+        self.board_full = np.zeros(n, dtype=bool)
+        self.obstacles = [[] for _ in range(n)]
+
+        for g in range(n):
+            self._reset_game(g)
+
+    # Per-game helpers (rare path)
+
+    def _grid(self, g: int) -> Grid:
+        return Grid.from_buffers(self.width, self.height, self.occupied[g], self.solid[g], self.blocked[g],
+                                 self.free[g], self.where[g], int(self.free_count[g]))
+
+    def _cell(self, pos) -> int:
+        return NONE if pos is None else int(pos[1]) * self.width + int(pos[0])
+
+    def _pos(self, cell: int):
+        return None if cell == NONE else (cell % self.width, cell // self.width)
+
+    def body_cells(self, g: int) -> np.ndarray:
+        """Cells of game g's snake, head first."""
+        return self.body[g, (self.head_ptr[g] + np.arange(self.length[g])) % self.capacity]
+
+    def _reset_game(self, g: int):
+        self.game_seeds[g] = self.seed_streams[g].getrandbits(64)
+        self.rngs[g] = random.Random(self.game_seeds[g])
+        self.level[g] = self.start_levels[g]
+        self.occupied[g] = 0
+        self.solid[g] = 0
+        self.blocked[g] = 0
+        self.free[g] = np.arange(self.size)
+        self.where[g] = np.arange(self.size)
+        self.free_count[g] = self.size
+
+        start = (self.width // 2, self.height // 2)
+        self.body[g, 0] = self._cell(start)
+        self.head_ptr[g] = 0
+        self.length[g] = 1
+        self.score[g] = 0
+        self.power[g] = NONE
+        self.power_timer[g] = 0
+        self.ticks[g] = 0
+        self.board_full[g] = False
+        self.food[g] = NONE
+        self.power_up[g] = NONE
+        self.power_up_until[g] = 0
+        self.obstacles[g] = []
+
+        grid = self._grid(g)
+        grid.add_segment(start)
+        self._place_obstacles(g, grid)
+        self.food[g] = self._cell(grid.sample(self.rngs[g], (None,)))
+        self.free_count[g] = grid.free_count
+        self.speed[g] = 5 + (self.level[g] - 1)
+
+    def _place_obstacles(self, g: int, grid: Grid):
+        rng = self.rngs[g]
+        def sample(exclude):
+            cell = grid.sample(rng, exclude)
+            return None if cell is None else (int(cell[0]), int(cell[1]))
+        head = self._pos(int(self.body[g, self.head_ptr[g]]))
+        exclude = [self._pos(int(self.food[g])), self._pos(int(self.power_up[g]))] + levels.clearance(grid, [head])
+        self.obstacles[g] = levels.add_obstacles(grid, sample, self.obstacles[g], int(self.level[g]), exclude)
+
+    def _set_power(self, g: int, power: int):
+        was_ghost = self.power[g] == GHOST
+        self.power[g] = power
+        if was_ghost != (power == GHOST):
+            cells = self.body_cells(g)
+            if was_ghost:
+                np.add.at(self.solid[g], cells, 1)
+            else:
+                np.subtract.at(self.solid[g], cells, 1)
+
+    def _pick_up(self, g: int):
+        self._set_power(g, self.rngs[g].choice([GHOST, SPEED, SCORE_MULTIPLIER]))
+        self.power_timer[g] = self.ticks[g] + POWER_UP_TICKS
+        self.power_up[g] = NONE
+
+    def _eat(self, g: int):
+        rng = self.rngs[g]
+        grid = self._grid(g)
+        self.power_up[g] = NONE
+        food = grid.sample(rng, (None,))
+        if food is None:
+            self.board_full[g] = True
+        else:
+            self.food[g] = self._cell(food)
+            if rng.random() < 0.15:
+                self.power_up[g] = self._cell(grid.sample(rng, (food,)))
+                self.power_up_until[g] = self.ticks[g] + POWER_UP_WINDOW
+            if self.length[g] % 5 == 0:
+                self.level[g] += 1
+                self._place_obstacles(g, grid)
+        self.free_count[g] = grid.free_count
+
+    def _grow(self):
+        order = (self.head_ptr[:, None] + np.arange(self.capacity)[None, :]) % self.capacity
+        body = np.zeros((self.n, self.capacity * 2), dtype=np.int32)
+        body[:, :self.capacity] = np.take_along_axis(self.body, order, axis=1)
+        self.body = body
+        self.head_ptr[:] = 0
+        self.capacity *= 2
+
+    # Vectorized occupancy updates; each row appears at most once per call
+
+    def _take(self, rows, cells):
+        slot = self.where[rows, cells]
+        last = self.free_count[rows] - 1
+        moved = self.free[rows, last]
+        self.free[rows, slot] = moved
+        self.where[rows, moved] = slot
+        self.free[rows, last] = cells
+        self.where[rows, cells] = last
+        self.free_count[rows] = last
+
+    def _release(self, rows, cells):
+        slot = self.where[rows, cells]
+        first = self.free_count[rows]
+        moved = self.free[rows, first]
+        self.free[rows, slot] = moved
+        self.where[rows, moved] = slot
+        self.free[rows, first] = cells
+        self.where[rows, cells] = first
+        self.free_count[rows] = first + 1
+
+    def _add_segments(self, rows, cells, solid):
+        occ = self.occupied[rows, cells]
+        empty = occ == 0
+        self._take(rows[empty], cells[empty])
+        self.occupied[rows, cells] = occ + 1
+        self.solid[rows[solid], cells[solid]] += 1
+
+    def _remove_segments(self, rows, cells, solid):
+        occ = self.occupied[rows, cells] - 1
+        self.occupied[rows, cells] = occ
+        empty = occ == 0
+        self._release(rows[empty], cells[empty])
+        self.solid[rows[solid], cells[solid]] -= 1
+
+    def step(self, actions):
+        """
+        Advance every game by one tick. `actions` holds an index into ACTIONS per game.
+        Returns (observations, rewards, dones); finished games are reset before the
+        observation is taken, so observations always show a live board.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = self._rows
+        w = self.width
+        head = self.body[rows, self.head_ptr].astype(np.int64)
+        nx = head % w + _DX[actions]
+        ny = head // w + _DY[actions]
+        inside = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < self.height)
+        new_head = np.where(inside, ny * w + nx, 0)
+        ghost = self.power == GHOST
+        hit = ~inside | np.where(ghost, self.blocked[rows, new_head] > 0, self.solid[rows, new_head] > 0)
+
+        self.ticks += 1
+        score_before = self.score.copy()
+
+        alive = rows[~hit]
+        cells = new_head[alive]
+        solid = ~ghost[alive]
+        if alive.size and self.length[alive].max() >= self.capacity:
+            self._grow()
+        ptr = (self.head_ptr[alive] - 1) % self.capacity
+        self.head_ptr[alive] = ptr
+        self.body[alive, ptr] = cells
+        self.length[alive] += 1
+        self._add_segments(alive, cells, solid)
+
+        ate = cells == self.food[alive]
+        eaters = alive[ate]
+        multiplier = np.where(self.power[eaters] == SCORE_MULTIPLIER, 2, 1)
+        self.score[eaters] += 10 * self.level[eaters] * multiplier
+
+        movers = alive[~ate]
+        tails = self.body[movers, (self.head_ptr[movers] + self.length[movers] - 1) % self.capacity]
+        self.length[movers] -= 1
+        self._remove_segments(movers, tails, solid[~ate])
+
+        moved_to = cells[~ate]
+        for g in movers[(self.power_up[movers] != NONE) & (moved_to == self.power_up[movers])]:
+            self._pick_up(g)
+        # What SnakeGame's timer wheel fires this tick: expiries, then uncollected power-ups vanishing
+        for g in alive[(self.power[alive] != NONE) & (self.ticks[alive] > self.power_timer[alive])]:
+            self._set_power(g, NONE)
+        self.power_up[(self.power_up != NONE) & (self.ticks == self.power_up_until) & ~hit] = NONE
+        for g in eaters:
+            self._eat(g)
+
+        self.speed = np.where(self.power == SPEED, 8, 5) + self.level - 1
+        rewards = (self.score - score_before).astype(np.float32)
+        dones = hit | self.board_full
+        self.finished = []
+        for g in np.nonzero(dones)[0]:
+            death = None
+            if hit[g]:
+                death = WALL if not inside[g] else HIT_OBSTACLE if self.blocked[g, new_head[g]] else SELF
+            self.finished.append(Run("batch", "ai", 0, self.start_levels[g], int(self.level[g]), int(self.score[g]),
+                                     int(self.length[g]), int(self.ticks[g]), self.game_seeds[g], death))
+            self._reset_game(g)
+        return self.observe(), rewards, dones
+
+    def observe(self) -> np.ndarray:
+        """(n, height, width) int8 boards using the EMPTY/BODY/HEAD/FOOD/POWER_UP/OBSTACLE codes."""
+        obs = np.where(self.occupied > 0, BODY, EMPTY).astype(np.int8)
+        obs[self.blocked > 0] = OBSTACLE
+        rows = self._rows
+        obs[rows, self.body[rows, self.head_ptr]] = HEAD
+        obs[rows, self.food] = FOOD
+        has_power_up = self.power_up != NONE
+        obs[rows[has_power_up], self.power_up[has_power_up]] = POWER_UP
+        return obs.reshape(self.n, self.height, self.width)
@@ -0,0 +1,428 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import engine
+from engine import SnakeGame, UP, DOWN, LEFT, RIGHT
+
+# Machine-specific, so not committed; written with --save-baseline
+BASELINE = "bench_baseline.json"
+
+# A scenario slower than its baseline by more than this fraction is a regression
+THRESHOLD = 0.15
+
+SCENARIOS: Dict[str, Callable[[int], dict]] = {}
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def _rate(count: int, seconds: float, unit: str, frame_times: Optional[List[float]] = None) -> dict:
+    result = {"rate": count / seconds, "unit": unit}
+    if frame_times:
+        ordered = sorted(frame_times)
+        for q in (50, 95, 99):
+            result[f"p{q}_ms"] = ordered[min(len(ordered) - 1, len(ordered) * q // 100)] * 1000
+    return result
+
+
+# Seeded boards
+
+def cycle_direction(pos, width: int, height: int):
+    """
+    Direction along a fixed Hamiltonian cycle of an even-height board: snake
+    through columns 1.. row by row, then back up column 0. A snake that follows
+    it never dies, so boards can be filled to any length.
+    """
+    x, y = pos
+    if x == 0:
+        return RIGHT if y == 0 else UP
+    if y % 2 == 0:
+        return RIGHT if x < width - 1 else DOWN
+    if x > 1:
+        return LEFT
+    return LEFT if y == height - 1 else DOWN
+
+
+def cycle_game(length: int = 1, width: int = engine.GRID_WIDTH, height: int = engine.GRID_HEIGHT,
+               seed: int = 0) -> SnakeGame:
+    """
+    A single-player game without obstacles whose snake lies `length` cells along
+    the cycle. Level-ups add none either, as the cycle covers every cell.
+    """
+    game = SnakeGame(width, height, seed=seed)
+    grid = game.grid
+    for obs in game.obstacles:
+        grid.remove_obstacle(obs)
+    game.obstacles = []
+    game.generate_obstacles = lambda: list(game.obstacles)
+    snake = game.snake1
+    grid.remove_segment(snake.body[0])
+    cells = [(0, 0)]
+    while len(cells) < length:
+        x, y = cells[-1]
+        d = cycle_direction((x, y), width, height)
+        cells.append((x + d[0], y + d[1]))
+    # The head is the cell furthest along the cycle
+    snake.body = deque(reversed(cells))
+    for cell in snake.body:
+        grid.add_segment(cell)
+    snake.direction = cycle_direction(snake.body[0], width, height)
+    game.food = game.generate_food()
+    return game
+
+
+def _run_cycle(game: SnakeGame, ticks: int) -> int:
+    """Follow the cycle for `ticks` ticks, starting over from the first state whenever the board fills up."""
+    start = game.snapshot()
+    snake = game.snake1
+    w, h = game.width, game.height
+    for _ in range(ticks):
+        snake.direction = cycle_direction(snake.body[0], w, h)
+        if game.move():
+            assert game.board_full, snake.death
+            game.restore(start)
+            snake = game.snake1
+    return ticks
+
+
+# Engine
+
+@scenario("engine.tick.short")
+def bench_tick_short(scale: int) -> dict:
+    ticks = 0
+    start = time.perf_counter()
+    for seed in range(10 * scale):
+        ticks += _run_cycle(cycle_game(1, seed=seed), 1000)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.tick.long")
+def bench_tick_long(scale: int) -> dict:
+    game = cycle_game(1000)
+    start = time.perf_counter()
+    ticks = _run_cycle(game, 10000 * scale)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.snake_move.long")
+def bench_snake_move(scale: int) -> dict:
+    game = cycle_game(1000)
+    snake = game.snake1
+    w, h = game.width, game.height
+    count = 10000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        snake.move(cycle_direction(snake.body[0], w, h), game)
+    return _rate(count, time.perf_counter() - start, "moves")
+
+
+@scenario("placement.food.full")
+def bench_food_full(scale: int) -> dict:
+    # 99% of the board taken by the snake
+    game = cycle_game(engine.GRID_WIDTH * engine.GRID_HEIGHT * 99 // 100)
+    count = 20000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        game.generate_food()
+    return _rate(count, time.perf_counter() - start, "placements")
+
+
+def _ai_ticks(game: SnakeGame, ticks: int) -> int:
+    """Play `ticks` ticks with the planner steering every snake, restarting finished games."""
+    for snake in game.snakes():
+        snake.controls = "ai"
+    for _ in range(ticks):
+        if game.move():
+            game.reset()
+            for snake in game.snakes():
+                snake.controls = "ai"
+    return ticks
+
+
+@scenario("ai.move")
+def bench_ai_move(scale: int) -> dict:
+    game = SnakeGame(seed=1, level=3)
+    snake = game.snake1
+    count, spent = 0, 0.0
+    for _ in range(2000 * scale):
+        start = time.perf_counter()
+        snake.direction = snake.ai_move(game)
+        spent += time.perf_counter() - start
+        count += 1
+        if game.move():
+            game.reset()
+            snake = game.snake1
+    return _rate(count, spent, "decisions")
+
+
+@scenario("engine.tick.multiplayer")
+def bench_multiplayer(scale: int) -> dict:
+    game = SnakeGame(seed=2, is_multiplayer=True)
+    start = time.perf_counter()
+    ticks = _ai_ticks(game, 2000 * scale)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.tick.arena8")
+def bench_arena(scale: int) -> dict:
+    game = SnakeGame(80, 60, seed=3, controls=["ai"] * 8)
+    start = time.perf_counter()
+    ticks = _ai_ticks(game, 500 * scale)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.tick.large")
+def bench_large(scale: int) -> dict:
+    game = SnakeGame(2000, 2000, seed=7, controls=["ai"], spawn_radius=20)
+    start = time.perf_counter()
+    ticks = _ai_ticks(game, 2000 * scale)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.tick.level10")
+def bench_level10(scale: int) -> dict:
+    game = SnakeGame(seed=4, level=10)
+    start = time.perf_counter()
+    ticks = _ai_ticks(game, 2000 * scale)
+    return _rate(ticks, time.perf_counter() - start, "ticks")
+
+
+@scenario("engine.snapshot.long")
+def bench_snapshot(scale: int) -> dict:
+    game = cycle_game(1000)
+    count = 2000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        game.restore(game.snapshot())
+    return _rate(count, time.perf_counter() - start, "round trips")
+
+
+@scenario("batch.step")
+def bench_batch(scale: int) -> dict:
+    try:
+        import numpy as np
+        from batch import BatchSnakeGame
+    except ImportError:
+        return {"skipped": "NumPy is not installed"}
+    n = 1024
+    games = BatchSnakeGame(n, seeds=range(n))
+    actions = np.random.default_rng(5).integers(0, 4, size=(50 * scale, n))
+    start = time.perf_counter()
+    for row in actions:
+        games.step(row)
+    return _rate(n * len(actions), time.perf_counter() - start, "game ticks")
+
+
+@scenario("selfplay.shards")
+def bench_selfplay(scale: int) -> dict:
+    try:
+        from selfplay import ShardWriter, episodes
+    except ImportError:
+        return {"skipped": "NumPy is not installed"}
+    steps = 0
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ShardWriter(directory, "bench", engine.GRID_WIDTH, engine.GRID_HEIGHT, 4096)
+        start = time.perf_counter()
+        for step in episodes(range(4 * scale), "greedy"):
+            writer.append(*step)
+            steps += 1
+        writer.close()
+        elapsed = time.perf_counter() - start
+    return _rate(steps, elapsed, "steps")
+
+
+@scenario("scores.record")
+def bench_scores(scale: int) -> dict:
+    from scores import Run, ScoreStore
+    runs = [Run("bench", "ai", 0, 1 + i % 5, 1 + i % 9, i * 7919 % 100003, 1 + i % 50, i % 1000, i, "wall")
+            for i in range(50000 * scale)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ScoreStore(os.path.join(directory, "scores.db"))
+        start = time.perf_counter()
+        store.record_many(runs)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        store.close()
+    return _rate(len(runs), elapsed, "runs")
+
+
+# Front end (dummy SDL drivers, nothing is shown or played)
+
+def _front_end():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        import Snake
+    except ImportError:
+        return None
+    if Snake.SCREEN is None:
+        Snake.init_display()
+    return Snake
+
+
+def _draw_game(Snake, length: int):
+    game = Snake.SnakeGame()
+    board = cycle_game(length, seed=6)
+    game.grid, game.arena, game.obstacles, game.food = board.grid, board.arena, board.obstacles, board.food
+    game.snake1.color = game.player1_color
+    game.state = Snake.PLAYING
+    game.dirty_all = True
+    return game
+
+
+@scenario("render.draw.incremental")
+def bench_draw(scale: int) -> dict:
+    Snake = _front_end()
+    if Snake is None:
+        return {"skipped": "pygame is not installed"}
+    game = _draw_game(Snake, 600)
+    w, h = game.width, game.height
+    times = []
+    for i in range(300 * scale):
+        snake = game.snake1
+        snake.move(cycle_direction(snake.body[0], w, h), game)
+        game.alpha = (i % 4) / 4
+        start = time.perf_counter()
+        game.draw()
+        times.append(time.perf_counter() - start)
+    return _rate(len(times), sum(times), "frames", times)
+
+
+@scenario("render.draw.full")
+def bench_draw_full(scale: int) -> dict:
+    Snake = _front_end()
+    if Snake is None:
+        return {"skipped": "pygame is not installed"}
+    game = _draw_game(Snake, 600)
+    times = []
+    for _ in range(100 * scale):
+        game.renderer.invalidate()
+        start = time.perf_counter()
+        game.draw()
+        times.append(time.perf_counter() - start)
+    return _rate(len(times), sum(times), "frames", times)
+
+
+@scenario("render.draw.background")
+def bench_draw_background(scale: int) -> dict:
+    # A frame on which the background animation steps to its next colour
+    Snake = _front_end()
+    if Snake is None:
+        return {"skipped": "pygame is not installed"}
+    game = _draw_game(Snake, 600)
+    times = []
+    for _ in range(100 * scale):
+        game.step_background()
+        start = time.perf_counter()
+        game.draw()
+        times.append(time.perf_counter() - start)
+    return _rate(len(times), sum(times), "frames", times)
+
+
+@scenario("audio.synthesize")
+def bench_synthesize(scale: int) -> dict:
+    try:
+        from audio import AudioManager, TONES
+    except ImportError:
+        return {"skipped": "pygame is not installed"}
+    count = 20 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        AudioManager._synthesize_sequence(TONES["over"])
+    return _rate(count, time.perf_counter() - start, "tones")
+
+
+def run(names: List[str], scale: int, repeat: int) -> Dict[str, dict]:
+    """Run each scenario `repeat` times and keep its best rate."""
+    results = {}
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            result = SCENARIOS[name](scale)
+            if "skipped" in result:
+                best = result
+                break
+            if best is None or result["rate"] > best["rate"]:
+                best = result
+        results[name] = best
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Names of scenarios that got slower than their baseline by more than `threshold`."""
+    return [name for name, result in results.items()
+            if "rate" in result and "rate" in baseline.get(name, {}) and
+            result["rate"] < baseline[name]["rate"] * (1 - threshold)]
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Snake performance benchmarks")
+    parser.add_argument("patterns", nargs="*", help="scenario name patterns, e.g. 'engine.*' (default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads, one run each")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE, help=f"baseline file (default: {BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(SCENARIOS))
+        return 0
+    names = [name for name in SCENARIOS if not args.patterns or any(fnmatch.fnmatch(name, p) for p in args.patterns)]
+    if not names:
+        print("No scenario matches")
+        return 2
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(names, 1 if args.quick else 2, 1 if args.quick else args.repeat)
+    regressions = compare(results, baseline, args.threshold)
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<28} skipped: {result['skipped']}")
+            continue
+        line = f"{name:<28} {result['rate']:>12,.0f} {result['unit']}/s"
+        if "p50_ms" in result:
+            line += f"   frame p50 {result['p50_ms']:.2f} p95 {result['p95_ms']:.2f} p99 {result['p99_ms']:.2f} ms"
+        if name in baseline and "rate" in baseline[name]:
+            change = result["rate"] / baseline[name]["rate"] - 1
+            line += f"   {change:+.1%} vs baseline" + ("  REGRESSION" if name in regressions else "")
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        # Keep entries for scenarios that were not run this time
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored.update({name: result for name, result in results.items() if "rate" in result})
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
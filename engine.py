@@ -0,0 +1,528 @@
+import random
+import struct
+import zlib
+from collections import deque
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import levels
+from ai import DEFAULT_BUDGET, PathPlanner
+from eventlog import log
+from grid import Grid
+from profiler import profiler
+from timers import TimerWheel
+
+# Board
+GRID_WIDTH = 40
+GRID_HEIGHT = 30
+
+# Directions
+UP = (0, -1)
+DOWN = (0, 1)
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+
+# Power-up types
+GHOST = 0
+SPEED = 1
+SCORE_MULTIPLIER = 2
+
+# Power-ups last 5 seconds at level-1 speed
+POWER_UP_TICKS = 25
+
+# Power-ups left on the board vanish after 8 seconds at level-1 speed
+POWER_UP_WINDOW = 40
+
+# Direction changes a snake can buffer ahead of the ticks that apply them
+MAX_QUEUED_TURNS = 3
+
+# Changed cells kept for the front end before falling back to a full redraw
+MAX_DIRTY = 4096
+
+# Death causes (Snake.death)
+WALL = "wall"
+OBSTACLE = "obstacle"
+SELF = "self"
+SNAKE = "snake"
+HEAD_ON = "head-on"
+DEATH_CAUSES = (WALL, OBSTACLE, SELF, SNAKE, HEAD_ON)
+
+
+class SnakeState(NamedTuple):
+    body: Tuple[Tuple[int, int], ...]
+    direction: Tuple[int, int]
+    color: Optional[Tuple[int, int, int]]
+    controls: str
+    score: int
+    power_up: Optional[int]
+    power_up_timer: int
+    turns: Tuple[Tuple[int, int], ...]
+    planner: Optional[tuple]
+    death: Optional[str]
+
+
+class Snapshot(NamedTuple):
+    """
+    Immutable copy of a SnakeGame taken by `snapshot`. Restoring never modifies it,
+    so one snapshot can seed any number of branches.
+    """
+    seed: int
+    rng_state: tuple
+    grid: Grid
+    ticks: int
+    level: int
+    speed: int
+    food: Optional[Tuple[int, int]]
+    power_up: Optional[Tuple[int, int]]
+    power_up_until: int
+    obstacles: Tuple[Tuple[int, int], ...]
+    board_full: bool
+    is_multiplayer: bool
+    snakes: Tuple[SnakeState, ...]
+
+
+def _pack_cells(cells) -> bytes:
+    # Little-endian int32 x, y pairs for checksums
+    flat = [c for cell in cells for c in cell]
+    return struct.pack("<%di" % len(flat), *flat)
+
+
+class Snake:
+    def __init__(self, start_pos, color=None, controls="user"):
+        self.body = deque([start_pos])
+        self.direction = RIGHT
+        self.color = color
+        self.score = 0
+        self.controls = controls
+        self.power_up = None
+        self.power_up_timer = 0
+        self.planner = None
+        self.turns = deque()
+        self.last_tail = None
+        # Why the snake died, or None while it is alive; dead bodies stay on the board
+        self.death = None
+
+    def queue_turn(self, direction):
+        """Buffer a direction change for a later tick; repeats and reversals are ignored."""
+        last = self.turns[-1] if self.turns else self.direction
+        if len(self.turns) < MAX_QUEUED_TURNS and direction != last and direction != (-last[0], -last[1]):
+            self.turns.append(direction)
+
+    def give_power_up(self, power_up, game):
+        """Switch to `power_up` for the next POWER_UP_TICKS ticks."""
+        self.set_power_up(power_up, game)
+        self.power_up_timer = game.ticks + POWER_UP_TICKS
+        game.timers.at(self.power_up_timer + 1, self.expire, game)
+
+    def expire(self, game):
+        # Timers are never cancelled, so skip the ones a later pickup made stale
+        if self.death is None and self.power_up is not None and game.ticks > self.power_up_timer:
+            self.set_power_up(None, game)
+
+    def set_power_up(self, power_up, game):
+        # Ghost bodies leave the collision layer so other snakes pass through them
+        was_ghost = self.power_up == GHOST
+        self.power_up = power_up
+        if was_ghost != (power_up == GHOST):
+            game.grid.set_solid(self.body, was_ghost)
+            game.dirty_all = True
+        elif game.power_up:
+            game.dirty.append(game.power_up)
+
+    def collision(self, new_head, game) -> Optional[str]:
+        """What moving the head to `new_head` would hit this tick, or None."""
+        grid = game.grid
+        if not grid.in_bounds(new_head):
+            return WALL
+        if grid.is_blocked(new_head):
+            return OBSTACLE
+        if self.power_up != GHOST and grid.is_solid(new_head):
+            # Only paid once per death, so a body scan is fine
+            return SELF if new_head in self.body else SNAKE
+        return None
+
+    def die(self, cause: str, game):
+        self.death = cause
+        self.last_tail = None
+        game.emit("over")
+
+    def move(self, direction, game):
+        """Move one step on its own; SnakeGame.move resolves all snakes together."""
+        try:
+            self.direction = direction
+            head = self.body[0]
+            new_head = (head[0] + direction[0], head[1] + direction[1])
+            cause = self.collision(new_head, game)
+            if cause is not None:
+                self.die(cause, game)
+                return True
+            self.advance(new_head, game)
+            return False
+        except Exception as e:
+            log.error("engine", "Error in snake move", error=e)
+            return True
+
+    def advance(self, new_head, game):
+        """Step onto `new_head`, which must be free of collisions."""
+        grid = game.grid
+        ghost = self.power_up == GHOST
+        self.body.appendleft(new_head)
+        grid.add_segment(new_head, not ghost)
+        game.dirty.append(new_head)
+
+        multiplier = 2 if self.power_up == SCORE_MULTIPLIER else 1
+        if new_head == game.food:
+            self.score += 10 * game.level * multiplier
+            self.last_tail = None
+            game.emit("eat")
+            return
+
+        tail = self.body.pop()
+        grid.remove_segment(tail, not ghost)
+        self.last_tail = tail
+        game.dirty.append(tail)
+
+        if game.power_up and new_head == game.power_up:
+            game.power_up = None
+            self.give_power_up(game.rng.choice([GHOST, SPEED, SCORE_MULTIPLIER]), game)
+            game.emit("power")
+
+    def ai_move(self, game, shared: Optional[dict] = None):
+        try:
+            if self.planner is None:
+                self.planner = PathPlanner()
+            return self.planner.choose(game.grid, self.body, self.direction, game.food,
+                                       self.power_up == GHOST, game.ai_budget, game.contested, shared)
+        except Exception as e:
+            log.error("engine", "Error in AI move", error=e)
+            return self.direction
+
+
+class SnakeGame:
+    """
+    Headless simulation: advances on integer ticks with no display, mixer or clock.
+    Sounds the front end should play are queued in `events`.
+
+    `controls` lists who steers each snake ("ai" or a player) for arenas of any
+    size; by default it is one player, or the AI against one player in multiplayer.
+    All snakes move at once each tick and collide through the shared grid.
+
+    With a `spawn_radius`, food, power-ups and obstacles appear within that many
+    cells of the player (see `focus`) instead of anywhere, which keeps boards far
+    larger than the screen playable.
+
+    Each level-up adds an obstacle where it cannot cut the board in two. With a
+    `layout` seed the obstacles come from a precomputed layout (see levels.py)
+    instead of being drawn at random.
+
+    Timed rules (power-up expiry, uncollected power-ups vanishing) run off
+    `timers`, a wheel advanced once per tick, rather than being checked every tick.
+    """
+    def __init__(self, width: int = GRID_WIDTH, height: int = GRID_HEIGHT, seed: Optional[int] = None,
+                 level: int = 1, is_multiplayer: bool = False, controls: Optional[Sequence[str]] = None,
+                 spawn_radius: Optional[int] = None, layout: Optional[int] = None):
+        self.width = width
+        self.height = height
+        self.spawn_radius = spawn_radius
+        self.layout = layout
+        # Each game gets its own seed from this stream, so any game can be replayed alone
+        self._seeds = random.Random(seed)
+        self.level = level
+        # Every game starts here, whatever level the last one reached
+        self.start_level = level
+        self.speed = 5
+        self.obstacles: List[Tuple[int, int]] = []
+        self.controls = list(controls) if controls is not None else None
+        self.is_multiplayer = is_multiplayer if controls is None else len(controls) > 1
+        self.arena: List[Snake] = []
+        # Cells two or more live heads could step into this tick
+        self.contested = set()
+        self.ai_budget = DEFAULT_BUDGET
+        self.events: List[str] = []
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None, level: Optional[int] = None):
+        """Start a new game at `level`, or at the level this one started at."""
+        try:
+            if level is not None:
+                self.start_level = level
+            self.level = self.start_level
+            self.seed = self._seeds.getrandbits(64) if seed is None else seed
+            self.rng = random.Random(self.seed)
+            self.grid = Grid(self.width, self.height)
+            self.arena = []
+            for i, controls in enumerate(self.roster()):
+                start = self.start_position(i)
+                self.arena.append(Snake(start, None, controls))
+                self.grid.add_segment(start)
+            self.ticks = 0
+            self.board_full = False
+            self.obstacles = []
+            self.food = None
+            self.power_up = None
+            self.power_up_until = 0
+            self.obstacles = self.generate_obstacles()
+            self.food = self.generate_food()
+            self.speed = 5 + (self.level - 1)
+            self.schedule_timers()
+            self.events.clear()
+            # Cells changed since the front end last drew; dirty_all asks for a full redraw
+            self.dirty: List[Tuple[int, int]] = []
+            self.dirty_all = True
+        except Exception as e:
+            log.error("engine", "Error in reset", error=e)
+
+    def roster(self) -> List[str]:
+        if self.controls is not None:
+            return self.controls
+        # P1 is AI, P2 is user in multiplayer mode
+        return ["ai", "user"] if self.is_multiplayer else ["user"]
+
+    def start_position(self, index: int) -> Tuple[int, int]:
+        w, h = self.width, self.height
+        spots = [(w // 2, h // 2), (w // 4, h // 4), (3 * w // 4, 3 * h // 4), (w // 4, 3 * h // 4), (3 * w // 4, h // 4)]
+        if index < len(spots) and self.grid.is_free(spots[index]):
+            return spots[index]
+        return self.grid.sample(self.rng)
+
+    @property
+    def snake1(self) -> Snake:
+        return self.arena[0]
+
+    @property
+    def snake2(self) -> Optional[Snake]:
+        return self.arena[1] if len(self.arena) > 1 else None
+
+    def snakes(self) -> List[Snake]:
+        return self.arena
+
+    def alive(self) -> List[Snake]:
+        return [snake for snake in self.arena if snake.death is None]
+
+    def focus(self) -> Tuple[int, int]:
+        """Head of the first player-steered snake, or of the first snake if the AI steers them all."""
+        snake = next((snake for snake in self.arena if snake.controls != "ai"), self.snake1)
+        return snake.body[0]
+
+    def spawn_cell(self, exclude=()):
+        """A free cell for a new item, near the focus when spawns are windowed; None if the board is full."""
+        if self.spawn_radius is None:
+            return self.grid.sample(self.rng, exclude)
+        return self.grid.sample_near(self.rng, self.focus(), self.spawn_radius, exclude)
+
+    def schedule_timers(self):
+        """Rebuild the timer wheel from the game state (after a reset, restore or rewind)."""
+        self.timers = TimerWheel(self.ticks)
+        for snake in self.arena:
+            if snake.power_up is not None:
+                self.timers.at(snake.power_up_timer + 1, snake.expire, self)
+        if self.power_up is not None:
+            self.timers.at(self.power_up_until, self.despawn_power_up)
+
+    def despawn_power_up(self):
+        if self.power_up is not None and self.ticks >= self.power_up_until:
+            self.dirty.append(self.power_up)
+            self.power_up = None
+
+    def emit(self, event: str):
+        self.events.append(event)
+
+    def drain_events(self) -> List[str]:
+        events, self.events = self.events, []
+        return events
+
+    def contested_cells(self, snakes: List[Snake]) -> set:
+        w, h = self.width, self.height
+        seen, contested = set(), set()
+        for snake in snakes:
+            x, y = snake.body[0]
+            for dx, dy in (UP, DOWN, LEFT, RIGHT):
+                if 0 <= x + dx < w and 0 <= y + dy < h:
+                    cell = (y + dy) * w + x + dx
+                    if cell in seen:
+                        contested.add(cell)
+                    seen.add(cell)
+        return contested
+
+    def generate_food(self):
+        """Returns a free cell for the food, or None when the board is full."""
+        try:
+            return self.spawn_cell((self.power_up,))
+        except Exception as e:
+            log.error("engine", "Error generating food", error=e)
+            return None
+
+    def generate_power_up(self):
+        try:
+            if self.rng.random() < 0.15:
+                return self.spawn_cell((self.food,))
+            return None
+        except Exception as e:
+            log.error("engine", "Error generating power-up", error=e)
+            return None
+
+    def generate_obstacles(self):
+        """
+        The current obstacles plus new ones up to `level`, keeping the grid in sync.
+        None lands on the food, the power-up or next to a live head.
+        """
+        try:
+            exclude = [self.food, self.power_up] + levels.clearance(self.grid, [s.body[0] for s in self.alive()])
+            if self.layout is not None:
+                cells = levels.layout(self.width, self.height, self.layout)
+                return levels.load_layout(self.grid, cells, self.obstacles, self.level, exclude)
+            return levels.add_obstacles(self.grid, self.spawn_cell, self.obstacles, self.level, exclude)
+        except Exception as e:
+            log.error("engine", "Error generating obstacles", error=e)
+            return list(self.obstacles)
+
+    def move(self):
+        try:
+            self.ticks += 1
+            alive = self.alive()
+            for snake in alive:
+                if snake.turns:
+                    snake.direction = snake.turns.popleft()
+            self.contested = self.contested_cells(alive) if len(alive) > 1 else set()
+            # The AI snakes all search from the same food, so one field serves them all this tick
+            shared = {}
+            for snake in alive:
+                if snake.controls == "ai":
+                    started = profiler.start()
+                    snake.direction = snake.ai_move(self, shared)
+                    profiler.stop("ai", started)
+
+            # Every snake moves at once: all targets are checked against the board as
+            # it was at the start of the tick, and heads meeting on a cell both die
+            targets = []
+            claims = {}
+            for snake in alive:
+                head, d = snake.body[0], snake.direction
+                target = (head[0] + d[0], head[1] + d[1])
+                targets.append(target)
+                if snake.power_up != GHOST:
+                    claims[target] = claims.get(target, 0) + 1
+            movers = []
+            for snake, target in zip(alive, targets):
+                cause = snake.collision(target, self)
+                if cause is None and snake.power_up != GHOST and claims[target] > 1:
+                    cause = HEAD_ON
+                if cause is None:
+                    movers.append((snake, target))
+                else:
+                    snake.die(cause, self)
+            for snake, target in movers:
+                snake.advance(target, self)
+            self.timers.advance()
+            survivors = len(movers)
+            game_over = survivors < min(2, len(self.arena))
+
+            eater = next((snake for snake, target in movers if target == self.food), None)
+            if eater is not None:
+                if self.power_up:
+                    self.dirty.append(self.power_up)
+                self.power_up = None
+                self.food = self.generate_food()
+                if self.food is None:
+                    # Nowhere left to put food: the board is full and the game ends
+                    self.board_full = True
+                    return True
+                self.power_up = self.generate_power_up()
+                self.dirty.append(self.food)
+                if self.power_up:
+                    self.dirty.append(self.power_up)
+                    self.power_up_until = self.ticks + POWER_UP_WINDOW
+                    self.timers.at(self.power_up_until, self.despawn_power_up)
+                if len(eater.body) % 5 == 0:
+                    self.level += 1
+                    self.obstacles = self.generate_obstacles()
+                    self.dirty_all = True
+                    self.emit("level")
+
+            self.update_speed()
+            if len(self.dirty) > min(self.grid.size, MAX_DIRTY):
+                # Nobody is drawing (headless run); a full redraw is cheaper than the backlog
+                self.dirty.clear()
+                self.dirty_all = True
+            return game_over
+        except Exception as e:
+            log.error("engine", "Error in move", error=e)
+            return True
+
+    def update_speed(self):
+        if any(snake.power_up == SPEED for snake in self.arena):
+            self.speed = 8 + (self.level - 1)
+        else:
+            self.speed = 5 + (self.level - 1)
+
+    def checksum(self) -> int:
+        """CRC32 of the whole simulation state, used to verify replays."""
+        food = self.food or (-1, -1)
+        power_up = self.power_up or (-1, -1)
+        crc = zlib.crc32(struct.pack("<qqqiiiiq", self.ticks, self.level, self.speed, *food, *power_up,
+                                     self.power_up_until))
+        # Explicit little-endian sizes throughout, so replays verify across platforms
+        crc = zlib.crc32(_pack_cells(self.obstacles), crc)
+        state = self.rng.getstate()[1]
+        crc = zlib.crc32(struct.pack("<%dI" % len(state), *state), crc)
+        for snake in self.snakes():
+            power = -1 if snake.power_up is None else snake.power_up
+            death = -1 if snake.death is None else DEATH_CAUSES.index(snake.death)
+            crc = zlib.crc32(struct.pack("<qqqiii", snake.score, power, snake.power_up_timer, *snake.direction, death),
+                             crc)
+            crc = zlib.crc32(_pack_cells(snake.body), crc)
+        return crc
+
+    def snapshot(self) -> Snapshot:
+        snakes = tuple(SnakeState(tuple(snake.body), snake.direction, snake.color, snake.controls, snake.score,
+                                  snake.power_up, snake.power_up_timer, tuple(snake.turns),
+                                  snake.planner.memento() if snake.planner else None, snake.death)
+                       for snake in self.snakes())
+        return Snapshot(self.seed, self.rng.getstate(), self.grid.copy(), self.ticks, self.level, self.speed,
+                        self.food, self.power_up, self.power_up_until, tuple(self.obstacles), self.board_full,
+                        self.is_multiplayer, snakes)
+
+    def restore(self, snapshot: Snapshot):
+        """
+        Return to the state captured by `snapshot`. Play continues exactly as it did
+        after the snapshot was taken (same spawns, same AI moves) given the same inputs.
+        """
+        try:
+            self.seed = snapshot.seed
+            self.rng.setstate(snapshot.rng_state)
+            self.grid = snapshot.grid.copy()
+            snakes = []
+            for state in snapshot.snakes:
+                snake = Snake(state.body[0], state.color, state.controls)
+                snake.body = deque(state.body)
+                snake.direction = state.direction
+                snake.score = state.score
+                snake.power_up = state.power_up
+                snake.power_up_timer = state.power_up_timer
+                snake.turns = deque(state.turns)
+                if state.planner is not None:
+                    snake.planner = PathPlanner.from_memento(state.planner)
+                snake.death = state.death
+                snakes.append(snake)
+            self.arena = snakes
+            self.is_multiplayer = snapshot.is_multiplayer
+            self.ticks = snapshot.ticks
+            self.level = snapshot.level
+            self.speed = snapshot.speed
+            self.food = snapshot.food
+            self.power_up = snapshot.power_up
+            self.power_up_until = snapshot.power_up_until
+            self.obstacles = list(snapshot.obstacles)
+            self.board_full = snapshot.board_full
+            self.schedule_timers()
+            self.events.clear()
+            self.dirty.clear()
+            self.dirty_all = True
+        except Exception as e:
+            log.error("engine", "Error in restore", error=e)
+
+    def run(self, ticks: int) -> int:
+        """Advance up to `ticks` ticks without rendering; returns the number played."""
+        for i in range(ticks):
+            if self.move():
+                return i + 1
+        return ticks
@@ -0,0 +1,177 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+# Events kept in memory for dumps, and how often the writer thread wakes (seconds)
+CAPACITY = 4096
+FLUSH_INTERVAL = 0.25
+
+# Events per second each source may log, in bursts of up to BURST
+RATE = 20.0
+BURST = 50
+
+
+class Event(NamedTuple):
+    time: float
+    level: int
+    source: str
+    message: str
+    fields: Dict[str, object]
+
+
+def format_event(event: Event, style: str = "text") -> str:
+    """One line: "12:34:56.789 ERROR   engine: Error in move error=..." or a JSON object."""
+    if style == "json":
+        record = {"time": event.time, "level": LEVEL_NAMES.get(event.level, event.level), "source": event.source,
+                  "message": event.message}
+        for key, value in event.fields.items():
+            record[key] = value if isinstance(value, (int, float, str, bool, type(None))) else str(value)
+        return json.dumps(record)
+    stamp = time.strftime("%H:%M:%S", time.localtime(event.time)) + f".{int(event.time % 1 * 1000):03d}"
+    fields = "".join(f" {key}={value}" for key, value in event.fields.items())
+    return f"{stamp} {LEVEL_NAMES.get(event.level, event.level).upper():<7} {event.source}: {event.message}{fields}"
+
+
+class EventLog:
+    """
+    Structured events (level, source, message and keyword fields) kept in a ring
+    of the last `capacity` and written out by a background thread, so logging
+    from the game loop only appends to memory and never waits on I/O.
+
+    Events at `capture` level and up go into the ring, where `dump` can write
+    them after a crash; those at `level` and up are also written to `stream`
+    (stderr by default). Each source may log `rate` events a second in bursts of
+    `burst`; the rest are dropped, and how many rides along on that source's
+    next event as `suppressed`. Writing starts with the first event, and again
+    in a process forked from one that was logging.
+    """
+    def __init__(self, capacity: int = CAPACITY, level: int = INFO, capture: int = DEBUG, rate: float = RATE,
+                 burst: int = BURST, stream=None, style: str = "text", flush_interval: float = FLUSH_INTERVAL):
+        self.level = level
+        self.capture = capture
+        self.rate = rate
+        self.burst = burst
+        self.stream = stream
+        self.style = style
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._ring = deque(maxlen=capacity)
+        # Events at the end of the ring the writer has not seen yet
+        self._unwritten = 0
+        # source -> [tokens, last refill time, events dropped since its last event]
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._closed = False
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.capture
+
+    def log(self, level: int, source: str, message: str, **fields):
+        if level < self.capture:
+            return
+        now = time.time()
+        if level >= ERROR:
+            # Keep the message, not the traceback and every frame it holds
+            for key, value in fields.items():
+                if isinstance(value, BaseException):
+                    fields[key] = repr(value)
+        with self._lock:
+            bucket = self._buckets.get(source)
+            if bucket is None:
+                bucket = self._buckets[source] = [self.burst, now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.dropped += 1
+                return
+            bucket[0] -= 1
+            if bucket[2]:
+                fields["suppressed"] = bucket[2]
+                bucket[2] = 0
+            self._ring.append(Event(now, level, source, message, fields))
+            self._unwritten = min(self._unwritten + 1, self._ring.maxlen)
+            start = self._pid != os.getpid() and not self._closed
+            if start:
+                self._pid = os.getpid()
+        if start:
+            threading.Thread(target=self._write_loop, name="event-log", daemon=True).start()
+        if level >= ERROR:
+            self._wake.set()
+
+    def debug(self, source: str, message: str, **fields):
+        self.log(DEBUG, source, message, **fields)
+
+    def info(self, source: str, message: str, **fields):
+        self.log(INFO, source, message, **fields)
+
+    def warning(self, source: str, message: str, **fields):
+        self.log(WARNING, source, message, **fields)
+
+    def error(self, source: str, message: str, **fields):
+        self.log(ERROR, source, message, **fields)
+
+    def recent(self, n: Optional[int] = None) -> List[Event]:
+        """The last `n` events kept (all of them by default), oldest first."""
+        with self._lock:
+            count = len(self._ring) if n is None else min(n, len(self._ring))
+            return list(islice(self._ring, len(self._ring) - count, None))
+
+    def flush(self):
+        """Write every event not yet written, on the calling thread."""
+        with self._write_lock:
+            with self._lock:
+                count, self._unwritten = self._unwritten, 0
+                events = list(islice(self._ring, len(self._ring) - count, None)) if count else []
+            lines = [format_event(event, self.style) for event in events if event.level >= self.level]
+            if lines:
+                stream = self.stream or sys.stderr
+                try:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+
+    def dump(self, path: str, n: Optional[int] = None) -> str:
+        """Write the last `n` events kept, debug ones included, to `path` (e.g. after a crash)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            for event in self.recent(n):
+                f.write(format_event(event, self.style) + "\n")
+        return path
+
+    def close(self):
+        """Stop the writer thread and write what is left."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def _write_loop(self):
+        pid = os.getpid()
+        while not self._closed and self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+log = EventLog()
+atexit.register(log.close)
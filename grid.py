@@ -0,0 +1,217 @@
+from array import array
+
+# Journal entries (see Grid.journal)
+_COUNTS = 0   # (kind, cell, occupied added, solid added, previous blocked flag)
+_TAKE = 1     # (kind, cell, slot it was taken from)
+_RELEASE = 2  # (kind, cell, slot it was released from)
+_SWAP = 3     # (kind, slot, slot)
+
+
+class Grid:
+    """
+    Per-cell occupancy counts for the board, updated incrementally as snakes move.
+    `occupied` counts everything sitting on a cell (snake segments and obstacles),
+    `solid` counts what a non-ghost snake collides with, and `blocked` marks obstacles.
+
+    Unoccupied cells are also kept in `free[:free_count]` (swap-remove order) with
+    `where` mapping each cell back to its slot, so placement is a single random draw.
+
+    While `journal` is a list every change is appended to it, and `undo` reverts
+    them exactly, free-cell order included, so later draws replay identically.
+    """
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.occupied = array("H", [0]) * self.size
+        self.solid = array("H", [0]) * self.size
+        self.blocked = bytearray(self.size)
+        self.free = array("I", range(self.size))
+        self.where = array("I", range(self.size))
+        self.free_count = self.size
+        self.journal = None
+
+    @classmethod
+    def from_buffers(cls, width: int, height: int, occupied, solid, blocked, free, where, free_count: int):
+        """Wrap existing per-cell buffers (e.g. one row of a batched NumPy array) without copying."""
+        grid = cls.__new__(cls)
+        grid.width = width
+        grid.height = height
+        grid.size = width * height
+        grid.occupied = occupied
+        grid.solid = solid
+        grid.blocked = blocked
+        grid.free = free
+        grid.where = where
+        grid.free_count = free_count
+        grid.journal = None
+        return grid
+
+    def copy(self) -> "Grid":
+        return Grid.from_buffers(self.width, self.height, array("H", self.occupied), array("H", self.solid),
+                                 bytearray(self.blocked), array("I", self.free), array("I", self.where),
+                                 self.free_count)
+
+    def index(self, pos) -> int:
+        return pos[1] * self.width + pos[0]
+
+    def in_bounds(self, pos) -> bool:
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def is_free(self, pos) -> bool:
+        return not self.occupied[pos[1] * self.width + pos[0]]
+
+    def is_solid(self, pos) -> bool:
+        return self.solid[pos[1] * self.width + pos[0]] > 0
+
+    def is_blocked(self, pos) -> bool:
+        return self.blocked[pos[1] * self.width + pos[0]] > 0
+
+    def _take(self, i: int):
+        # Swap cell i with the last free slot and shrink the free region
+        slot = self.where[i]
+        last = self.free_count - 1
+        moved = self.free[last]
+        self.free[slot] = moved
+        self.where[moved] = slot
+        self.free[last] = i
+        self.where[i] = last
+        self.free_count = last
+        if self.journal is not None:
+            self.journal.append((_TAKE, i, slot))
+
+    def _release(self, i: int):
+        slot = self.where[i]
+        first = self.free_count
+        moved = self.free[first]
+        self.free[slot] = moved
+        self.where[moved] = slot
+        self.free[first] = i
+        self.where[i] = first
+        self.free_count = first + 1
+        if self.journal is not None:
+            self.journal.append((_RELEASE, i, slot))
+
+    def add_segment(self, pos, solid: bool = True):
+        i = pos[1] * self.width + pos[0]
+        if not self.occupied[i]:
+            self._take(i)
+        self.occupied[i] += 1
+        if solid:
+            self.solid[i] += 1
+        if self.journal is not None:
+            self.journal.append((_COUNTS, i, 1, int(solid), self.blocked[i]))
+
+    def remove_segment(self, pos, solid: bool = True):
+        i = pos[1] * self.width + pos[0]
+        self.occupied[i] -= 1
+        if not self.occupied[i]:
+            self._release(i)
+        if solid:
+            self.solid[i] -= 1
+        if self.journal is not None:
+            self.journal.append((_COUNTS, i, -1, -int(solid), self.blocked[i]))
+
+    def set_solid(self, cells, solid: bool):
+        """Add or remove a whole body from the collision layer (ghost on/off)."""
+        step = 1 if solid else -1
+        w = self.width
+        for x, y in cells:
+            self.solid[y * w + x] += step
+            if self.journal is not None:
+                self.journal.append((_COUNTS, y * w + x, 0, step, self.blocked[y * w + x]))
+
+    def add_obstacle(self, pos):
+        i = pos[1] * self.width + pos[0]
+        if self.journal is not None:
+            self.journal.append((_COUNTS, i, 1, 1, self.blocked[i]))
+        self.blocked[i] = 1
+        if not self.occupied[i]:
+            self._take(i)
+        self.occupied[i] += 1
+        self.solid[i] += 1
+
+    def remove_obstacle(self, pos):
+        i = pos[1] * self.width + pos[0]
+        if self.journal is not None:
+            self.journal.append((_COUNTS, i, -1, -1, self.blocked[i]))
+        self.blocked[i] = 0
+        self.occupied[i] -= 1
+        if not self.occupied[i]:
+            self._release(i)
+        self.solid[i] -= 1
+
+    def sample(self, rng, exclude=()):
+        """
+        Pick a uniformly random free cell, skipping the positions in `exclude`
+        (food, power-up). Returns None when no cell is left.
+        """
+        n = self.free_count
+        for pos in exclude:
+            if pos is None:
+                continue
+            i = pos[1] * self.width + pos[0]
+            slot = self.where[i]
+            if slot < n:
+                # Park excluded cells just past the sampled range; order is irrelevant
+                n -= 1
+                other = self.free[n]
+                self.free[slot] = other
+                self.where[other] = slot
+                self.free[n] = i
+                self.where[i] = n
+                if self.journal is not None:
+                    self.journal.append((_SWAP, slot, n))
+        if n <= 0:
+            return None
+        cell = self.free[rng.randrange(n)]
+        return (cell % self.width, cell // self.width)
+
+    def sample_near(self, rng, center, radius: int, exclude=(), tries: int = 32):
+        """
+        Pick a random free cell at most `radius` cells from `center` on each axis,
+        skipping `exclude`. Costs the same however large the board is; falls back
+        to `sample` when `tries` draws in the window all hit occupied cells.
+        """
+        x0, x1 = max(0, center[0] - radius), min(self.width - 1, center[0] + radius)
+        y0, y1 = max(0, center[1] - radius), min(self.height - 1, center[1] + radius)
+        for _ in range(tries):
+            x, y = rng.randint(x0, x1), rng.randint(y0, y1)
+            if not self.occupied[y * self.width + x] and (x, y) not in exclude:
+                return (x, y)
+        return self.sample(rng, exclude)
+
+    def undo(self, journal):
+        """Revert the changes recorded in `journal`, newest first."""
+        free, where = self.free, self.where
+        for entry in reversed(journal):
+            kind = entry[0]
+            if kind == _COUNTS:
+                _, i, occupied, solid, blocked = entry
+                self.occupied[i] -= occupied
+                self.solid[i] -= solid
+                self.blocked[i] = blocked
+            elif kind == _SWAP:
+                _, a, b = entry
+                cell_a, cell_b = free[a], free[b]
+                free[a], free[b] = cell_b, cell_a
+                where[cell_b], where[cell_a] = a, b
+            elif kind == _TAKE:
+                # Put the cell back in its old slot and the displaced cell back at the end
+                _, i, slot = entry
+                last = self.free_count
+                moved = free[slot]
+                free[slot] = i
+                where[i] = slot
+                free[last] = moved
+                where[moved] = last
+                self.free_count = last + 1
+            else:
+                _, i, slot = entry
+                first = self.free_count - 1
+                moved = free[slot]
+                free[first] = moved
+                where[moved] = first
+                free[slot] = i
+                where[i] = slot
+                self.free_count = first
@@ -0,0 +1,124 @@
+import random
+from collections import deque
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from grid import Grid
+
+# The eight cells around a cell in ring order, starting north; even entries are its edge neighbours
+_RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+# Rejected candidates in a row before a level makes do with fewer obstacles
+MAX_TRIES = 32
+
+# Levels a precomputed layout covers
+LAYOUT_LEVELS = 256
+
+
+def keeps_connected(grid: Grid, pos) -> bool:
+    """
+    True if an obstacle on `pos` leaves the open board in one piece. Checked
+    locally in O(1): the open cells around `pos` must form a single run round
+    its ring that touches all its open edge neighbours, so any path through
+    `pos` can step around it instead. Bodies count as open since they move on.
+    """
+    x, y = pos
+    w, h = grid.width, grid.height
+    ring = [0 <= x + dx < w and 0 <= y + dy < h and not grid.blocked[(y + dy) * w + x + dx] for dx, dy in _RING]
+    if all(ring):
+        return True
+    start = ring.index(False)
+    runs = 0
+    touches = False
+    for k in range(1, 9):
+        i = (start + k) % 8
+        if ring[i]:
+            touches = touches or i % 2 == 0
+        else:
+            runs += touches
+            touches = False
+    return runs <= 1
+
+
+def connected(grid: Grid) -> bool:
+    """Flood fill check that every cell without an obstacle can reach every other one."""
+    w, size = grid.width, grid.size
+    open_cells = size - sum(grid.blocked)
+    if open_cells == 0:
+        return True
+    start = grid.blocked.index(0)
+    seen = bytearray(size)
+    seen[start] = 1
+    frontier = deque([start])
+    count = 1
+    while frontier:
+        cell = frontier.popleft()
+        x = cell % w
+        for nxt in (cell - w, cell + w, cell - 1 if x > 0 else -1, cell + 1 if x < w - 1 else -1):
+            if 0 <= nxt < size and not seen[nxt] and not grid.blocked[nxt]:
+                seen[nxt] = 1
+                count += 1
+                frontier.append(nxt)
+    return count == open_cells
+
+
+def clearance(grid: Grid, heads: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """The cells next to each head, where a new obstacle would give a player no time to react."""
+    cells = []
+    for x, y in heads:
+        for dx, dy in _RING[::2]:
+            if 0 <= x + dx < grid.width and 0 <= y + dy < grid.height:
+                cells.append((x + dx, y + dy))
+    return cells
+
+
+def add_obstacles(grid: Grid, sample: Callable[[Sequence], Optional[Tuple[int, int]]],
+                  obstacles: Sequence[Tuple[int, int]], count: int, exclude: Sequence = ()) -> List[Tuple[int, int]]:
+    """
+    A new list of `obstacles` plus random ones from `sample(exclude)` up to `count`,
+    added to `grid` one by one and each kept only if the board stays connected.
+    """
+    obstacles = list(obstacles)
+    tries = 0
+    while len(obstacles) < count and tries < MAX_TRIES:
+        cell = sample(exclude)
+        if cell is None:
+            break
+        if not keeps_connected(grid, cell):
+            tries += 1
+            continue
+        tries = 0
+        grid.add_obstacle(cell)
+        obstacles.append(cell)
+    return obstacles
+
+
+@lru_cache(maxsize=32)
+def layout(width: int, height: int, seed: int, levels: int = LAYOUT_LEVELS) -> Tuple[Tuple[int, int], ...]:
+    """
+    Obstacle cells for a seeded layout, the first `level` of them in play at each
+    level. Built once per board size and seed, on an empty board with the start
+    spots and their neighbours kept clear, then served from the cache.
+    """
+    grid = Grid(width, height)
+    starts = [(width // 2, height // 2), (width // 4, height // 4), (3 * width // 4, 3 * height // 4),
+              (width // 4, 3 * height // 4), (3 * width // 4, height // 4)]
+    rng = random.Random(seed)
+    exclude = starts + clearance(grid, starts)
+    return tuple(add_obstacles(grid, lambda skip: grid.sample(rng, skip), (), levels, exclude))
+
+
+def load_layout(grid: Grid, cells: Sequence[Tuple[int, int]], obstacles: Sequence[Tuple[int, int]], count: int,
+                exclude: Sequence = ()) -> List[Tuple[int, int]]:
+    """
+    `obstacles` plus the first `count` layout `cells` not yet placed. Cells that
+    are taken, excluded or would split the board now are skipped, and tried
+    again at the next level.
+    """
+    obstacles = list(obstacles)
+    placed = set(obstacles)
+    for cell in cells[:count]:
+        if cell not in placed and grid.is_free(cell) and cell not in exclude and keeps_connected(grid, cell):
+            grid.add_obstacle(cell)
+            obstacles.append(cell)
+    return obstacles
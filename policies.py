@@ -0,0 +1,89 @@
+import importlib
+import random
+from typing import Callable, Dict, List, Tuple
+
+from ai import PathPlanner
+from engine import UP, DOWN, LEFT, RIGHT, GHOST
+
+Direction = Tuple[int, int]
+
+# A policy steers one snake: policy(game, snake) gives its direction for the next tick.
+# Policies are built by factories that take a seed, so each process can make its own.
+Policy = Callable[[object, object], Direction]
+
+POLICIES: Dict[str, Callable[[int], Policy]] = {}
+
+
+def policy(name: str):
+    def register(factory):
+        POLICIES[name] = factory
+        return factory
+    return register
+
+
+def make_policy(name: str, seed: int = 0) -> Policy:
+    """A registered policy, or one from any module as "module:factory"."""
+    if name in POLICIES:
+        return POLICIES[name](seed)
+    module, sep, attr = name.partition(":")
+    if not sep:
+        raise ValueError(f"unknown policy {name!r} (expected one of {', '.join(POLICIES)} or module:factory)")
+    return getattr(importlib.import_module(module), attr)(seed)
+
+
+def safe_moves(game, snake) -> List[Direction]:
+    """Directions that do not run into a wall, an obstacle or a body (or reverse) this tick."""
+    x, y = snake.body[0]
+    reverse = (-snake.direction[0], -snake.direction[1])
+    moves = []
+    for d in (UP, DOWN, LEFT, RIGHT):
+        target = (x + d[0], y + d[1])
+        if d == reverse and len(snake.body) > 1:
+            continue
+        if snake.collision(target, game) is None:
+            moves.append(d)
+    return moves
+
+
+def _planner(budget=None):
+    def factory(seed: int) -> Policy:
+        def choose(game, snake):
+            if snake.planner is None:
+                snake.planner = PathPlanner()
+            alive = game.alive()
+            # Called before SnakeGame.move, which would otherwise work these out
+            contested = game.contested_cells(alive) if len(alive) > 1 else ()
+            return snake.planner.choose(game.grid, snake.body, snake.direction, game.food, snake.power_up == GHOST,
+                                        game.ai_budget if budget is None else budget, contested)
+        return choose
+    return factory
+
+
+policy("planner")(_planner())
+# The planner with a tenth of the default search budget
+policy("planner-lite")(_planner(400))
+
+
+@policy("greedy")
+def greedy(seed: int) -> Policy:
+    """Straight for the food by Manhattan distance, avoiding only immediate collisions."""
+    def choose(game, snake):
+        moves = safe_moves(game, snake)
+        if not moves:
+            return snake.direction
+        if game.food is None:
+            return moves[0]
+        fx, fy = game.food
+        x, y = snake.body[0]
+        return min(moves, key=lambda d: abs(x + d[0] - fx) + abs(y + d[1] - fy))
+    return choose
+
+
+@policy("random")
+def random_moves(seed: int) -> Policy:
+    """A random safe move each tick, from its own random stream."""
+    rng = random.Random(seed)
+    def choose(game, snake):
+        moves = safe_moves(game, snake)
+        return rng.choice(moves) if moves else snake.direction
+    return choose
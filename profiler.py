@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+from collections import deque
+from time import perf_counter_ns
+from typing import Dict, List
+
+
+class Profiler:
+    """
+    Per-phase frame timings. Wrap a phase as
+
+        started = profiler.start()
+        ...
+        profiler.stop("draw", started)
+
+    While disabled `start` returns 0 and `stop` returns at once, so the calls can
+    stay in place permanently. Percentiles cover the last `window` samples of
+    each phase; counts, means and maxima cover everything since the last reset.
+    """
+    def __init__(self, window: int = 600):
+        self.enabled = False
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        # phase -> [count, total ns, max ns]
+        self._totals: Dict[str, List[int]] = {}
+
+    def start(self) -> int:
+        return perf_counter_ns() if self.enabled else 0
+
+    def stop(self, phase: str, started: int):
+        if started:
+            self.record(phase, perf_counter_ns() - started)
+
+    def record(self, phase: str, elapsed_ns: int):
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = deque(maxlen=self.window)
+            self._totals[phase] = [0, 0, 0]
+        samples.append(elapsed_ns)
+        totals = self._totals[phase]
+        totals[0] += 1
+        totals[1] += elapsed_ns
+        if elapsed_ns > totals[2]:
+            totals[2] = elapsed_ns
+
+    def reset(self):
+        self._samples.clear()
+        self._totals.clear()
+
+    def __bool__(self):
+        return bool(self._totals)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Milliseconds per phase: count, mean, p50, p95, p99 and max."""
+        result = {}
+        for phase, samples in self._samples.items():
+            ordered = sorted(samples)
+            count, total, worst = self._totals[phase]
+            def percentile(q):
+                return ordered[min(len(ordered) - 1, len(ordered) * q // 100)] / 1e6
+            result[phase] = {"count": count, "mean": total / count / 1e6, "p50": percentile(50),
+                             "p95": percentile(95), "p99": percentile(99), "max": worst / 1e6}
+        return result
+
+    def export(self, prefix: str) -> List[str]:
+        """Write `prefix`.json (stats plus the recent samples) and `prefix`.csv (stats); returns the paths."""
+        stats = self.stats()
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(prefix + ".json", "w") as f:
+            json.dump({"unit": "ms", "window": self.window, "phases": stats,
+                       "samples": {phase: [ns / 1e6 for ns in samples] for phase, samples in self._samples.items()}},
+                      f, indent=2)
+        with open(prefix + ".csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["phase", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+            for phase, row in stats.items():
+                writer.writerow([phase, row["count"]] + [f"{row[k]:.4f}" for k in ("mean", "p50", "p95", "p99", "max")])
+        return [prefix + ".json", prefix + ".csv"]
+
+
+# Shared by the engine and the front end; off until someone turns it on
+profiler = Profiler()
@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple
+
+import pygame
+
+Color = Tuple[int, int, int]
+
+# Transparent colour of the board's overlay layers; nothing on the board is drawn in it
+KEY = (255, 0, 254)
+
+
+class SurfaceCache:
+    """
+    Bounded LRU cache of rendered surfaces with hit/miss counters.
+    `render` caches text by (font, text, color); `get` caches anything built by a factory.
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: Hashable, factory: Callable[[], pygame.Surface]) -> pygame.Surface:
+        surface = self._items.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = factory()
+        self._items[key] = surface
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return surface
+
+    def render(self, font, text: str, color: Color) -> pygame.Surface:
+        return self.get((font, text, color), lambda: font.render(text, True, color))
+
+    def clear(self):
+        self._items.clear()
+
+
+class BoardRenderer:
+    """
+    Draws the playing field incrementally.
+
+    The border, grid lines and obstacles are pre-rendered to a colour-keyed layer,
+    and snakes, food and power-ups to another one cell at a time from the cells the
+    engine marks dirty. The background is the fill colour with the first layer over
+    it and the board the background with the second, and only changed rects are
+    copied to the screen. A new fill colour composes the layers again rather than
+    repainting them. Anything drawn over the board (HUD, menus) is erased again
+    with `restore`.
+
+    Every layer is the size of the screen. Boards larger than that are seen
+    through a camera whose top-left cell is `camera`; only cells in the view are
+    ever painted, so drawing costs the same whatever the board size.
+    """
+    def __init__(self, screen, cell_size: int, line_color: Color = (50, 50, 50)):
+        self.screen = screen
+        self.cell_size = cell_size
+        self.line_color = line_color
+        self.lines = pygame.Surface(screen.get_size())
+        self.lines.set_colorkey(KEY)
+        self.pieces = pygame.Surface(screen.get_size())
+        self.pieces.set_colorkey(KEY)
+        self.background = pygame.Surface(screen.get_size())
+        self.board = pygame.Surface(screen.get_size())
+        self.view = (screen.get_width() // cell_size, screen.get_height() // cell_size)
+        self.camera = (0, 0)
+        self._key = None
+        self._bg_color = None
+        self._full = True
+
+    def invalidate(self):
+        self._full = True
+
+    def changed(self, game) -> bool:
+        """True if the next `draw` would paint anything."""
+        return self._full or game.dirty_all or bool(game.dirty)
+
+    def follow(self, pos, width: int, height: int):
+        """
+        Move the camera over a `width` x `height` board when `pos` comes within a
+        quarter of the view of its edge, re-centring on `pos`. The camera moves in
+        jumps rather than every tick, since each move repaints the whole view.
+        """
+        vw, vh = self.view
+        cx, cy = self.camera
+        x, y = pos
+        if not cx + vw // 4 <= x < cx + vw - vw // 4:
+            cx = min(max(x - vw // 2, 0), max(width - vw, 0))
+        if not cy + vh // 4 <= y < cy + vh - vh // 4:
+            cy = min(max(y - vh // 2, 0), max(height - vh, 0))
+        if (cx, cy) != self.camera:
+            self.camera = (cx, cy)
+            self._full = True
+
+    def visible(self, pos) -> bool:
+        cx, cy = self.camera
+        return cx <= pos[0] < cx + self.view[0] and cy <= pos[1] < cy + self.view[1]
+
+    def cell_rect(self, pos) -> pygame.Rect:
+        cs = self.cell_size
+        return pygame.Rect((pos[0] - self.camera[0]) * cs, (pos[1] - self.camera[1]) * cs, cs, cs)
+
+    def restore(self, rect):
+        """Copy the board back over whatever was drawn on top of `rect`."""
+        self.screen.blit(self.board, rect, rect)
+
+    def draw_partial(self, pos, color: Color, edge, fraction: float, layer=None) -> pygame.Rect:
+        """
+        Draw a cell on the screen only partly filled with `color`, anchored to the
+        side facing `edge`, over `layer` (the background unless given). Used to slide
+        heads and tails between simulation ticks; erase it again with `restore`.
+        """
+        rect = self.cell_rect(pos)
+        self.screen.blit(self.background if layer is None else layer, rect, rect)
+        size = int(self.cell_size * fraction)
+        part = rect.copy()
+        if edge == (-1, 0):
+            part.width = size
+        elif edge == (1, 0):
+            part.left, part.width = rect.right - size, size
+        elif edge == (0, -1):
+            part.height = size
+        elif edge == (0, 1):
+            part.top, part.height = rect.bottom - size, size
+        if size > 0:
+            self.screen.fill(color, part)
+        return rect
+
+    def _paint_lines(self, game, border_color, border_width, obstacle_color):
+        lines = self.lines
+        width, height = lines.get_size()
+        cs = self.cell_size
+        lines.fill(KEY)
+        # The board's outline, of which only the part in view lands on the surface
+        pygame.draw.rect(lines, border_color, (-self.camera[0] * cs, -self.camera[1] * cs,
+                                            game.width * cs, game.height * cs), border_width)
+        for x in range(0, width, cs):
+            pygame.draw.line(lines, self.line_color, (x, 0), (x, height))
+        for y in range(0, height, cs):
+            pygame.draw.line(lines, self.line_color, (0, y), (width, y))
+        for obs in game.obstacles:
+            if self.visible(obs):
+                lines.fill(obstacle_color, self.cell_rect(obs))
+
+    def _paint_pieces(self, game, cell_color, snake_color):
+        self.pieces.fill(KEY)
+        for snake in game.snakes():
+            color = snake_color(snake)
+            for segment in snake.body:
+                if self.visible(segment):
+                    self.pieces.fill(color, self.cell_rect(segment))
+        for pos in (game.food, game.power_up):
+            if pos and self.visible(pos):
+                self.pieces.fill(cell_color(pos), self.cell_rect(pos))
+
+    def _paint_cell(self, pos, color: Optional[Color]) -> pygame.Rect:
+        rect = self.cell_rect(pos)
+        self.board.blit(self.background, rect, rect)
+        if color is None:
+            self.pieces.fill(KEY, rect)
+        else:
+            self.pieces.fill(color, rect)
+            self.board.fill(color, rect)
+        return rect
+
+    def draw(self, game, bg_color: Color, border_color: Color, border_width: int, obstacle_color: Color,
+             cell_color: Callable[[Tuple[int, int]], Optional[Color]],
+             snake_color: Callable[[object], Color]) -> List[pygame.Rect]:
+        """
+        Bring the board layer and the screen up to date and return the screen rects
+        that changed. `cell_color` gives the colour of a single changed cell (None for
+        empty); `snake_color` the colour of a whole snake for full repaints.
+        """
+        full = self._full or game.dirty_all
+        rects = []
+        if full:
+            self._paint_pieces(game, cell_color, snake_color)
+        else:
+            seen = set()
+            grid = game.grid
+            for pos in game.dirty:
+                if pos in seen or not grid.in_bounds(pos) or not self.visible(pos):
+                    continue
+                seen.add(pos)
+                rects.append(self._paint_cell(pos, cell_color(pos)))
+        game.dirty_all = False
+        game.dirty.clear()
+
+        key = (border_color, border_width)
+        if full or key != self._key:
+            self._paint_lines(game, border_color, border_width, obstacle_color)
+        if full or key != self._key or bg_color != self._bg_color:
+            self.background.fill(bg_color)
+            self.background.blit(self.lines, (0, 0))
+            self.board.blit(self.background, (0, 0))
+            self.board.blit(self.pieces, (0, 0))
+            self.screen.blit(self.board, (0, 0))
+            self._key = key
+            self._bg_color = bg_color
+            self._full = False
+            return [self.screen.get_rect()]
+
+        for rect in rects:
+            self.screen.blit(self.board, rect, rect)
+        return rects
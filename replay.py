@@ -0,0 +1,216 @@
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from engine import SnakeGame, UP, DOWN, LEFT, RIGHT
+
+MAGIC = b"SNKR"
+VERSION = 6
+
+# magic, version, flags, width, height, level, ai_budget, seed, checksum interval,
+# spawn radius (0 for the whole board), layout seed, snake count, then one byte per snake: 1 if the AI steers it
+_HEADER = struct.Struct("<4sBBHHHIQHHIB")
+_CRC = struct.Struct("<I")
+
+# Header flags
+_HAS_LAYOUT = 1
+
+# Record types; each is followed by a varint tick delta from the previous record
+_INPUT = 1      # varint (snake index << 2 | direction code)
+_CHECKSUM = 2   # u32 state checksum
+_END = 3        # u32 final state checksum
+
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+_DIRECTION_CODES = {d: i for i, d in enumerate(DIRECTIONS)}
+
+
+class ReplayError(Exception):
+    pass
+
+
+class ReplayMismatch(ReplayError):
+    def __init__(self, tick: int, expected: int, actual: int):
+        super().__init__(f"state diverged at tick {tick}: expected checksum {expected:08x}, got {actual:08x}")
+        self.tick = tick
+        self.expected = expected
+        self.actual = actual
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class ReplayWriter:
+    """
+    Records one game as its seed and configuration plus the ticks at which
+    player-controlled snakes changed direction, with a state checksum every
+    `checksum_interval` ticks. Call `capture` after every SnakeGame.move, and
+    `truncate` after rewinding the game.
+    """
+    def __init__(self, game: SnakeGame, checksum_interval: int = 64):
+        self.checksum_interval = checksum_interval
+        snakes = game.snakes()
+        flags = _HAS_LAYOUT if game.layout is not None else 0
+        self.header = _HEADER.pack(MAGIC, VERSION, flags, game.width, game.height, game.level, game.ai_budget,
+                                   game.seed, checksum_interval, game.spawn_radius or 0, game.layout or 0,
+                                   len(snakes))
+        self.header += bytes(snake.controls == "ai" for snake in snakes)
+        self.records = bytearray()
+        self._first_tick = self._last_tick = game.ticks
+        # (tick, offset) of every record, so the recording can be cut back on rewind
+        self._marks: List[Tuple[int, int]] = []
+        self._directions = [snake.direction for snake in game.snakes()]
+        self.finished = False
+
+    def _record(self, kind: int, tick: int):
+        self._marks.append((tick, len(self.records)))
+        self.records.append(kind)
+        _write_varint(self.records, tick - self._last_tick)
+        self._last_tick = tick
+
+    def capture(self, game: SnakeGame):
+        if self.finished:
+            return
+        for i, snake in enumerate(game.snakes()):
+            if snake.direction != self._directions[i] and snake.controls != "ai":
+                self._directions[i] = snake.direction
+                self._record(_INPUT, game.ticks)
+                _write_varint(self.records, i << 2 | _DIRECTION_CODES[snake.direction])
+        if game.ticks % self.checksum_interval == 0:
+            self._record(_CHECKSUM, game.ticks)
+            self.records += _CRC.pack(game.checksum())
+
+    def finish(self, game: SnakeGame) -> bytes:
+        if not self.finished:
+            self._record(_END, game.ticks)
+            self.records += _CRC.pack(game.checksum())
+            self.finished = True
+        return self.to_bytes()
+
+    def truncate(self, game: SnakeGame):
+        """Forget everything recorded after the tick `game` is now at."""
+        while self._marks and self._marks[-1][0] > game.ticks:
+            del self.records[self._marks.pop()[1]:]
+        self._last_tick = self._marks[-1][0] if self._marks else self._first_tick
+        self._directions = [snake.direction for snake in game.snakes()]
+        self.finished = False
+
+    def to_bytes(self) -> bytes:
+        return self.header + bytes(self.records)
+
+    def save(self, path: str, game: Optional[SnakeGame] = None):
+        data = self.finish(game) if game is not None else self.to_bytes()
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+class Replay:
+    """A parsed replay that can rebuild, seek and fast-forward its game headlessly."""
+    def __init__(self, data: bytes):
+        if len(data) < _HEADER.size:
+            raise ReplayError("replay is truncated")
+        (magic, version, flags, self.width, self.height, self.level, self.ai_budget,
+         self.seed, self.checksum_interval, self.spawn_radius, layout, count) = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError("not a replay file or unsupported version")
+        self.layout = layout if flags & _HAS_LAYOUT else None
+        if len(data) < _HEADER.size + count:
+            raise ReplayError("replay is truncated")
+        self.controls = ["ai" if ai else "user" for ai in data[_HEADER.size:_HEADER.size + count]]
+        self.inputs: Dict[int, List[Tuple[int, Tuple[int, int]]]] = {}
+        self.checksums: Dict[int, int] = {}
+        self.end_tick: Optional[int] = None
+
+        pos, tick = _HEADER.size + count, 0
+        try:
+            while pos < len(data):
+                kind = data[pos]
+                delta, pos = _read_varint(data, pos + 1)
+                tick += delta
+                if kind == _INPUT:
+                    code, pos = _read_varint(data, pos)
+                    self.inputs.setdefault(tick, []).append((code >> 2, DIRECTIONS[code & 3]))
+                elif kind in (_CHECKSUM, _END):
+                    self.checksums[tick], = _CRC.unpack_from(data, pos)
+                    pos += _CRC.size
+                    if kind == _END:
+                        self.end_tick = tick
+                else:
+                    raise ReplayError(f"unknown record type {kind}")
+        except (IndexError, struct.error):
+            raise ReplayError("replay is truncated")
+        self.last_tick = self.end_tick if self.end_tick is not None else tick
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def new_game(self) -> SnakeGame:
+        game = SnakeGame(self.width, self.height, level=self.level, controls=self.controls,
+                         spawn_radius=self.spawn_radius or None, layout=self.layout)
+        game.ai_budget = self.ai_budget
+        game.reset(self.seed)
+        return game
+
+    def advance(self, game: SnakeGame, tick: int, verify: bool = True) -> bool:
+        """
+        Fast-forward `game` to `tick` without rendering. Returns True if the game
+        ended on the way. Raises ReplayMismatch when a stored checksum disagrees.
+        """
+        snakes = game.snakes()
+        while game.ticks < tick:
+            for index, direction in self.inputs.get(game.ticks + 1, ()):
+                snakes[index].direction = direction
+            over = game.move()
+            game.events.clear()
+            if verify and game.ticks in self.checksums:
+                actual = game.checksum()
+                if actual != self.checksums[game.ticks]:
+                    raise ReplayMismatch(game.ticks, self.checksums[game.ticks], actual)
+            if over:
+                return True
+        return False
+
+    def seek(self, tick: int, verify: bool = True) -> SnakeGame:
+        """A fresh game played up to `tick`."""
+        game = self.new_game()
+        self.advance(game, min(tick, self.last_tick), verify)
+        return game
+
+    def play(self, verify: bool = True) -> SnakeGame:
+        """Run the whole replay at full speed and return the final state."""
+        return self.seek(self.last_tick, verify)
+
+
+def main(argv: List[str]) -> int:
+    if not argv:
+        print("usage: python replay.py REPLAY [TICK]")
+        return 2
+    replay = Replay.load(argv[0])
+    try:
+        game = replay.seek(int(argv[1])) if len(argv) > 1 else replay.play()
+    except ReplayMismatch as e:
+        print(f"Replay FAILED: {e}")
+        return 1
+    scores = ", ".join(f"P{i + 1}: {snake.score}" for i, snake in enumerate(game.snakes()))
+    print(f"Replay OK at tick {game.ticks} (seed {replay.seed}, level {game.level}): {scores}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,105 @@
+from collections import deque
+
+from ai import PathPlanner
+from engine import SnakeGame
+
+
+class RewindBuffer:
+    """
+    The last `capacity` ticks of a game, kept as undo records so play can be
+    stepped back instantly without copying the board or bodies every tick.
+
+    A record holds only what its tick changed: the grid journal (heads added,
+    tails removed, spawns), the tail each snake dropped, the previous scalars,
+    and the random state for ticks that drew from it. Bodies, obstacle lists and
+    planner fields are shared with the game rather than copied. Pending timers
+    follow from that state, so the game's timer wheel is rebuilt after rewinding.
+
+    Call `begin` before and `commit` after every SnakeGame.move. The buffer starts
+    over by itself when the game is reset or restored from a snapshot.
+    """
+    def __init__(self, capacity: int = 600):
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)
+        self._grid = None
+        self._rng = None
+        self._rng_state = None
+        self._before = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def clear(self):
+        self.records.clear()
+        self._grid = None
+        self._rng = None
+        self._rng_state = None
+
+    def begin(self, game: SnakeGame):
+        if game.grid is not self._grid or game.rng is not self._rng:
+            self.clear()
+            self._grid = game.grid
+            self._rng = game.rng
+            self._rng_state = game.rng.getstate()
+        game.grid.journal = []
+        snakes = [(snake.body[0], snake.body[-1], len(snake.body), snake.direction, snake.score, snake.power_up,
+                   snake.power_up_timer, tuple(snake.turns), snake.planner.memento() if snake.planner else None,
+                   snake.death)
+                  for snake in game.snakes()]
+        self._before = (game.ticks, game.level, game.speed, game.food, game.power_up, game.power_up_until,
+                        game.obstacles, game.board_full, snakes)
+
+    def commit(self, game: SnakeGame):
+        if self._before is None:
+            return
+        journal, game.grid.journal = game.grid.journal, None
+        ticks, level, speed, food, power_up, power_up_until, obstacles, board_full, before = self._before
+        self._before = None
+
+        # Only spawns draw random numbers, and every spawn moves the food, the power-up or the obstacles
+        rng_state = None
+        if game.food != food or game.power_up != power_up or game.obstacles is not obstacles:
+            rng_state = self._rng_state
+            self._rng_state = game.rng.getstate()
+
+        snakes = []
+        for snake, (head, tail, length, *rest) in zip(game.snakes(), before):
+            moved = snake.body[0] != head
+            dropped = tail if moved and len(snake.body) == length else None
+            snakes.append((moved, dropped, *rest))
+        self.records.append((ticks, level, speed, food, power_up, power_up_until, obstacles, board_full, rng_state,
+                             journal, snakes))
+
+    def rewind(self, game: SnakeGame, ticks: int = 1) -> int:
+        """Step `game` back up to `ticks` ticks; returns how many were undone."""
+        count = 0
+        while count < ticks and self.records:
+            (game.ticks, game.level, game.speed, game.food, game.power_up, game.power_up_until, obstacles,
+             game.board_full, rng_state, journal, snakes) = self.records.pop()
+            game.grid.undo(journal)
+            game.obstacles = obstacles
+            if rng_state is not None:
+                game.rng.setstate(rng_state)
+            for snake, change in zip(game.snakes(), snakes):
+                moved, dropped, direction, score, power, timer, turns, planner, death = change
+                if moved:
+                    snake.body.popleft()
+                    if dropped is not None:
+                        snake.body.append(dropped)
+                snake.direction = direction
+                snake.score = score
+                snake.power_up = power
+                snake.power_up_timer = timer
+                snake.turns = deque(turns)
+                snake.planner = PathPlanner.from_memento(planner) if planner is not None else None
+                snake.death = death
+            count += 1
+        if count:
+            self._rng_state = game.rng.getstate()
+            game.schedule_timers()
+            for snake in game.snakes():
+                snake.last_tail = None
+            game.events.clear()
+            game.dirty.clear()
+            game.dirty_all = True
+        return count
@@ -0,0 +1,225 @@
+import argparse
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from eventlog import log
+
+DEFAULT_PATH = "scores.db"
+
+# Rows written per transaction, and how long queued rows may wait for a full batch (seconds)
+BATCH_SIZE = 20000
+FLUSH_INTERVAL = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    mode TEXT NOT NULL,
+    controls TEXT NOT NULL,
+    player INTEGER NOT NULL,
+    start_level INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    seed INTEGER,
+    death TEXT,
+    policy TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_level ON runs (mode, start_level, score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_mode ON runs (mode, score DESC);
+"""
+
+_INSERT = ("INSERT INTO runs (finished, mode, controls, player, start_level, level, score, length, ticks, seed, death, "
+           "policy) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class Run(NamedTuple):
+    """One finished snake: its final score, level, length and tick count, why it died, and which AI policy steered it."""
+    mode: str
+    controls: str
+    player: int
+    start_level: int
+    level: int
+    score: int
+    length: int
+    ticks: int
+    seed: Optional[int] = None
+    death: Optional[str] = None
+    finished: float = 0.0
+    policy: Optional[str] = None
+
+
+def _signed(seed: Optional[int]) -> Optional[int]:
+    # Seeds are unsigned 64-bit; SQLite integers are signed
+    return seed - (1 << 64) if seed is not None and seed >= 1 << 63 else seed
+
+
+def _unsigned(seed: Optional[int]) -> Optional[int]:
+    return seed + (1 << 64) if seed is not None and seed < 0 else seed
+
+
+class ScoreStore:
+    """
+    Finished runs in a SQLite database in WAL mode, ranked per mode and starting level.
+
+    `record` only puts rows on a queue; a writer thread inserts them in batches of
+    up to BATCH_SIZE per transaction, so the game loop never waits on the disk.
+    Queries use their own connection and see what has been written so far; call
+    `flush` first to include everything recorded.
+    """
+    def __init__(self, path: str = DEFAULT_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+        self._reader = None
+        db = self._connect()
+        db.executescript(_SCHEMA)
+        if "policy" not in [row[1] for row in db.execute("PRAGMA table_info(runs)")]:
+            # Databases from before policies were recorded
+            db.execute("ALTER TABLE runs ADD COLUMN policy TEXT")
+        db.close()
+        self._writer = threading.Thread(target=self._write_loop, name="score-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        # Leaderboard index pages stay cached across batches (64 MB)
+        db.execute("PRAGMA cache_size=-65536")
+        return db
+
+    def record(self, run: Run):
+        self._queue.put(run)
+
+    def record_many(self, runs: Iterable[Run]):
+        for run in runs:
+            self._queue.put(run)
+
+    def record_game(self, game, mode: str, start_level: Optional[int] = None):
+        """Queue a row for every snake of a finished engine.SnakeGame."""
+        now = time.time()
+        start = game.start_level if start_level is None else start_level
+        for i, snake in enumerate(game.snakes()):
+            self._queue.put(Run(mode, snake.controls, i, start, game.level, snake.score, len(snake.body),
+                                game.ticks, game.seed, snake.death, now))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything recorded so far is written; False on timeout."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Write what is queued and stop the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _write_loop(self):
+        db = self._connect()
+        try:
+            running = True
+            while running:
+                batch, waiting = [], []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                # Take whatever else is already queued, up to a full batch
+                while True:
+                    if item is None:
+                        running = False
+                    elif isinstance(item, threading.Event):
+                        waiting.append(item)
+                    else:
+                        batch.append((item.finished or time.time(), item.mode, item.controls, item.player,
+                                      item.start_level, item.level, item.score, item.length, item.ticks,
+                                      _signed(item.seed), item.death, item.policy))
+                    if not running or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        with db:
+                            db.executemany(_INSERT, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error as e:
+                        log.error("scores", "Error writing scores", rows=len(batch), error=e)
+                for event in waiting:
+                    event.set()
+        finally:
+            db.close()
+
+    def _query(self, sql: str, args=()) -> List[tuple]:
+        if self._reader is None:
+            self._reader = self._connect()
+        return self._reader.execute(sql, args).fetchall()
+
+    def top(self, k: int = 10, mode: Optional[str] = None, start_level: Optional[int] = None,
+            controls: Optional[str] = None, policy: Optional[str] = None) -> List[Run]:
+        """The `k` best runs, optionally only for one mode, starting level, kind of player or AI policy."""
+        where, args = [], []
+        for column, value in (("mode", mode), ("start_level", start_level), ("controls", controls),
+                              ("policy", policy)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        sql = ("SELECT mode, controls, player, start_level, level, score, length, ticks, seed, death, finished, "
+               "policy FROM runs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY score DESC LIMIT ?")
+        rows = self._query(sql, args + [k])
+        return [Run(*row[:8], _unsigned(row[8]), *row[9:]) for row in rows]
+
+    def best(self, mode: Optional[str] = None, controls: Optional[str] = None) -> int:
+        runs = self.top(1, mode, controls=controls)
+        return runs[0].score if runs else 0
+
+    def stats(self, mode: Optional[str] = None) -> Dict[str, object]:
+        """Run count, score/length/tick averages, best score and deaths by cause."""
+        where, args = ("WHERE mode = ?", (mode,)) if mode is not None else ("", ())
+        count, mean_score, best, mean_length, mean_ticks = self._query(
+            f"SELECT COUNT(*), AVG(score), MAX(score), AVG(length), AVG(ticks) FROM runs {where}", args)[0]
+        deaths = dict(self._query(f"SELECT COALESCE(death, 'none'), COUNT(*) FROM runs {where} GROUP BY 1", args))
+        return {"runs": count, "mean_score": mean_score or 0.0, "best": best or 0, "mean_length": mean_length or 0.0,
+                "mean_ticks": mean_ticks or 0.0, "deaths": deaths}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Snake leaderboards")
+    parser.add_argument("--db", default=DEFAULT_PATH)
+    parser.add_argument("--mode")
+    parser.add_argument("--level", type=int, help="starting level")
+    parser.add_argument("--controls", choices=["user", "ai"])
+    parser.add_argument("--policy", help="only runs steered by this AI policy (tournaments)")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    store = ScoreStore(args.db)
+    try:
+        stats = store.stats(args.mode)
+        print(f"{stats['runs']} runs, mean score {stats['mean_score']:.1f}, best {stats['best']}, "
+              f"mean length {stats['mean_length']:.1f}, deaths {stats['deaths']}")
+        for rank, run in enumerate(store.top(args.k, args.mode, args.level, args.controls, args.policy), 1):
+            print(f"{rank:>3}. {run.score:>7}  {run.mode:<12} level {run.start_level}->{run.level}  "
+                  f"length {run.length}  {run.ticks} ticks  {run.death or ''}  {run.policy or ''}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
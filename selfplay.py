@@ -0,0 +1,288 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import ACTIONS, EMPTY, BODY, HEAD, FOOD, POWER_UP, OBSTACLE
+from engine import GRID_WIDTH, GRID_HEIGHT, SnakeGame
+from policies import POLICIES, make_policy
+
+INDEX = "index.json"
+VERSION = 1
+
+# Steps per shard file, and episodes per task handed to a worker
+SHARD_SIZE = 16384
+CHUNK = 16
+
+# Games stopped by max_ticks end there and count as done
+MAX_TICKS = 10000
+
+# Field name, dtype and per-step shape (None for the board) of every shard array
+FIELDS = (("obs", "int8", None), ("action", "uint8", ()), ("reward", "float32", ()), ("done", "bool", ()))
+
+
+class ObservationEncoder:
+    """
+    A game's board as an int8 (height, width) array with batch.py's cell codes
+    (POWER_UP over FOOD over HEAD over OBSTACLE over BODY), kept up to date from
+    the cells the engine marks dirty each tick instead of being rebuilt. It takes
+    over `game.dirty`, so it cannot share a game with a renderer.
+    """
+    def __init__(self, game: SnakeGame):
+        self.game = game
+        self.board = np.zeros((game.height, game.width), dtype=np.int8)
+        self._cells = self.board.reshape(-1)
+        # Cells showing a head, food or power-up code in the last observation
+        self._marks: List[Tuple[int, int]] = []
+        game.dirty_all = True
+
+    def _code(self, pos, heads) -> int:
+        game = self.game
+        if pos == game.power_up:
+            return POWER_UP
+        if pos == game.food:
+            return FOOD
+        if pos in heads:
+            return HEAD
+        i = game.grid.index(pos)
+        if game.grid.blocked[i]:
+            return OBSTACLE
+        return BODY if game.grid.occupied[i] else EMPTY
+
+    def rebuild(self):
+        grid = self.game.grid
+        occupied = np.frombuffer(grid.occupied, dtype=np.uint16)
+        self._cells[:] = np.where(occupied > 0, BODY, EMPTY)
+        self._cells[np.frombuffer(grid.blocked, dtype=np.uint8) > 0] = OBSTACLE
+
+    def observe(self) -> np.ndarray:
+        """The current board. This is the encoder's own array, updated in place next time; copy it to keep it."""
+        game = self.game
+        heads = {snake.body[0] for snake in game.snakes()}
+        marks = [cell for cell in (game.food, game.power_up) if cell is not None] + list(heads)
+        if game.dirty_all:
+            self.rebuild()
+            cells = marks
+            game.dirty_all = False
+        else:
+            cells = game.dirty + self._marks + marks
+        game.dirty.clear()
+        w = game.width
+        for pos in cells:
+            self._cells[pos[1] * w + pos[0]] = self._code(pos, heads)
+        self._marks = marks
+        return self.board
+
+
+def episodes(seeds: Sequence[int], policy: str = "planner", width: int = GRID_WIDTH, height: int = GRID_HEIGHT,
+             level: int = 1, max_ticks: int = MAX_TICKS, layout: Optional[int] = None
+             ) -> Iterator[Tuple[np.ndarray, int, float, bool]]:
+    """
+    Play one single-player game per seed with `policy` steering and yield
+    (observation, action, reward, done) every tick: the board the policy saw,
+    the index of its move in batch.ACTIONS, the score gained and whether the
+    game ended. The observation is only valid until the next step.
+    """
+    for seed in seeds:
+        game = SnakeGame(width, height, seed=seed, level=level, controls=["policy"], layout=layout)
+        encoder = ObservationEncoder(game)
+        choose = make_policy(policy, seed)
+        snake = game.snake1
+        done = False
+        while not done:
+            obs = encoder.observe()
+            direction = choose(game, snake)
+            score = snake.score
+            snake.direction = direction
+            done = game.move() or game.ticks >= max_ticks
+            yield obs, ACTIONS.index(direction), float(snake.score - score), done
+
+
+class ShardWriter:
+    """
+    Appends steps to fixed-size memory-mapped .npy shards, one file per field
+    (`<name>.obs.npy`, `<name>.action.npy`, ...). Each shard is allocated at
+    `shard_size` steps up front; `close` returns how many steps each one holds.
+    """
+    def __init__(self, directory: str, prefix: str, width: int, height: int, shard_size: int = SHARD_SIZE):
+        self.directory = directory
+        self.prefix = prefix
+        self.width = width
+        self.height = height
+        self.shard_size = shard_size
+        self.shards: List[Dict[str, object]] = []
+        self._arrays: Optional[Dict[str, np.memmap]] = None
+        self._steps = 0
+        self._episodes = 0
+
+    def _open(self):
+        name = f"{self.prefix}-{len(self.shards):04d}"
+        self._arrays = {}
+        for field, dtype, shape in FIELDS:
+            shape = (self.shard_size,) + ((self.height, self.width) if shape is None else shape)
+            path = os.path.join(self.directory, f"{name}.{field}.npy")
+            self._arrays[field] = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.shards.append({"name": name, "steps": 0, "episodes": 0})
+        self._steps = self._episodes = 0
+
+    def _finish(self):
+        for array in self._arrays.values():
+            array.flush()
+        self.shards[-1].update(steps=self._steps, episodes=self._episodes)
+        self._arrays = None
+
+    def append(self, obs, action: int, reward: float, done: bool):
+        if self._arrays is None:
+            self._open()
+        i = self._steps
+        arrays = self._arrays
+        arrays["obs"][i] = obs
+        arrays["action"][i] = action
+        arrays["reward"][i] = reward
+        arrays["done"][i] = done
+        self._steps += 1
+        self._episodes += done
+        if self._steps == self.shard_size:
+            self._finish()
+
+    def close(self) -> List[Dict[str, object]]:
+        if self._arrays is not None:
+            self._finish()
+        return self.shards
+
+
+def _generate(task) -> List[Dict[str, object]]:
+    # Runs in a pool worker: one chunk of seeds into its own shards
+    directory, prefix, seeds, options = task
+    writer = ShardWriter(directory, prefix, options["width"], options["height"], options["shard_size"])
+    for step in episodes(seeds, options["policy"], options["width"], options["height"], options["level"],
+                         options["max_ticks"], options["layout"]):
+        writer.append(*step)
+    return writer.close()
+
+
+def generate(directory: str, count: int, workers: int = 1, policy: str = "planner", seed: int = 0,
+             width: int = GRID_WIDTH, height: int = GRID_HEIGHT, level: int = 1, shard_size: int = SHARD_SIZE,
+             max_ticks: int = MAX_TICKS, layout: Optional[int] = None, chunk: int = CHUNK) -> Dict[str, object]:
+    """
+    Play `count` games (seeds `seed`, `seed + 1`, ...) across `workers` processes
+    and write their shards and an index to `directory`. Games are split into
+    chunks of `chunk` seeds, so the output does not depend on the worker count.
+    """
+    make_policy(policy, seed)
+    os.makedirs(directory, exist_ok=True)
+    options = {"policy": policy, "width": width, "height": height, "level": level, "shard_size": shard_size,
+               "max_ticks": max_ticks, "layout": layout}
+    seeds = list(range(seed, seed + count))
+    tasks = [(directory, f"c{i // chunk:05d}", seeds[i:i + chunk], options) for i in range(0, count, chunk)]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            # Chunks stream back in seed order as they finish
+            results = list(pool.imap(_generate, tasks))
+    else:
+        results = [_generate(task) for task in tasks]
+    shards = [shard for result in results for shard in result]
+    index = dict(options, version=VERSION, seed=seed,
+                 fields={field: [dtype, [height, width] if shape is None else list(shape)]
+                         for field, dtype, shape in FIELDS},
+                 steps=sum(shard["steps"] for shard in shards),
+                 episodes=sum(shard["episodes"] for shard in shards), shards=shards)
+    with open(os.path.join(directory, INDEX), "w") as f:
+        json.dump(index, f, indent=1)
+    return index
+
+
+class Dataset:
+    """Read side of a `generate` directory; shards are memory-mapped read-only, never loaded whole."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            self.index = json.load(f)
+        if self.index.get("version") != VERSION:
+            raise ValueError(f"unsupported self-play index version {self.index.get('version')}")
+
+    def __len__(self) -> int:
+        return self.index["steps"]
+
+    @property
+    def shards(self) -> List[Dict[str, object]]:
+        return self.index["shards"]
+
+    def shard(self, i: int) -> Dict[str, np.ndarray]:
+        shard = self.shards[i]
+        return {field: np.load(os.path.join(self.directory, f"{shard['name']}.{field}.npy"), mmap_mode="r")
+                [:shard["steps"]] for field, _, _ in FIELDS}
+
+    def batches(self, batch_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        """Every step in order, `batch_size` at a time (the last batch may be short)."""
+        pending: List[Dict[str, np.ndarray]] = []
+        held = 0
+        for i in range(len(self.shards)):
+            data = self.shard(i)
+            steps = self.shards[i]["steps"]
+            start = 0
+            while start < steps:
+                take = min(batch_size - held, steps - start)
+                pending.append({field: array[start:start + take] for field, array in data.items()})
+                held += take
+                start += take
+                if held == batch_size:
+                    yield _join(pending)
+                    pending, held = [], 0
+        if pending:
+            yield _join(pending)
+
+
+def _join(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if len(parts) == 1:
+        return parts[0]
+    return {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Self-play data for Snake agents")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="play games and write memory-mapped shards")
+    gen.add_argument("out")
+    gen.add_argument("--episodes", type=int, default=64)
+    gen.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    gen.add_argument("--policy", default="planner", help=f"{', '.join(POLICIES)} or module:factory")
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--width", type=int, default=GRID_WIDTH)
+    gen.add_argument("--height", type=int, default=GRID_HEIGHT)
+    gen.add_argument("--level", type=int, default=1)
+    gen.add_argument("--layout", type=int)
+    gen.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    gen.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    gen.add_argument("--chunk", type=int, default=CHUNK, help="games per task")
+    info = sub.add_parser("info", help="summarise a generated directory")
+    info.add_argument("out")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        index = generate(args.out, args.episodes, args.workers, args.policy, args.seed, args.width, args.height,
+                         args.level, args.shard_size, args.max_ticks, args.layout, args.chunk)
+        print(f"{index['episodes']} episodes, {index['steps']} steps in {len(index['shards'])} shards")
+        return 0
+
+    data = Dataset(args.out)
+    index = data.index
+    print(f"{index['policy']} on {index['width']}x{index['height']}, level {index['level']}: "
+          f"{index['episodes']} episodes, {index['steps']} steps in {len(index['shards'])} shards")
+    reward = 0.0
+    actions = np.zeros(len(ACTIONS), dtype=np.int64)
+    for batch in data.batches(SHARD_SIZE):
+        reward += float(batch["reward"].sum())
+        actions += np.bincount(batch["action"], minlength=len(ACTIONS))
+    if len(data):
+        print(f"mean score {reward / max(1, index['episodes']):.1f}, "
+              f"actions (up, down, left, right) {', '.join(str(n) for n in actions)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
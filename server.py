@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from engine import SnakeGame, UP, DOWN, LEFT, RIGHT
+from eventlog import log
+from replay import _read_varint, _write_varint
+
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+_DIRECTION_CODES = {d: i for i, d in enumerate(DIRECTIONS)}
+
+# Every message is a u16 length followed by a type byte and its fields
+_LENGTH = struct.Struct("<H")
+
+# Client -> server
+JOIN = 1      # varint room id
+INPUT = 2     # u8 direction code
+# Server -> client
+WELCOME = 3   # varint room id, u8 snake index (SPECTATOR if none), u16 width, u16 height
+FULL = 4      # the whole state; sent on join and after every round
+DELTA = 5     # what one tick changed, see DeltaEncoder
+
+SPECTATOR = 0xFF
+
+# DELTA section flags
+_FOOD = 0x01
+_POWER_UP = 0x02
+_OBSTACLES = 0x04
+_SCORES = 0x08
+_POWERS = 0x10
+_LEVEL = 0x20
+_OVER = 0x40
+
+# Clients whose unsent output grows past this are dropped rather than slowing the tick loop
+MAX_CLIENT_BUFFER = 256 * 1024
+
+
+def _cell(game, pos) -> int:
+    """Cells are sent as index + 1 so 0 can mean "none"."""
+    return 0 if pos is None else pos[1] * game.width + pos[0] + 1
+
+
+def _pos(width: int, cell: int):
+    return None if cell == 0 else ((cell - 1) % width, (cell - 1) // width)
+
+
+def _power(power_up: Optional[int]) -> int:
+    return 0 if power_up is None else power_up + 1
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    _write_varint(out, value)
+    return bytes(out)
+
+
+def frame(message: bytes) -> bytes:
+    return _LENGTH.pack(len(message)) + message
+
+
+def encode_full(game: SnakeGame) -> bytes:
+    out = bytearray([FULL])
+    for value in (game.ticks, game.level, _cell(game, game.food), _cell(game, game.power_up), len(game.obstacles)):
+        _write_varint(out, value)
+    for obs in game.obstacles:
+        _write_varint(out, _cell(game, obs))
+    snakes = game.snakes()
+    _write_varint(out, len(snakes))
+    for snake in snakes:
+        for value in (snake.score, _power(snake.power_up), len(snake.body)):
+            _write_varint(out, value)
+        for segment in snake.body:
+            _write_varint(out, _cell(game, segment))
+    return bytes(out)
+
+
+class DeltaEncoder:
+    """
+    Remembers what clients of one game were last sent and encodes each tick as
+    the difference: per snake the new head cell and whether it grew (bodies are
+    never resent), followed only by the sections that changed.
+    """
+    def __init__(self, game: SnakeGame):
+        self.sync(game)
+
+    def sync(self, game: SnakeGame):
+        snakes = game.snakes()
+        self.heads = [snake.body[0] for snake in snakes]
+        self.lengths = [len(snake.body) for snake in snakes]
+        self.scores = [snake.score for snake in snakes]
+        self.powers = [snake.power_up for snake in snakes]
+        self.food = game.food
+        self.power_up = game.power_up
+        self.obstacles = game.obstacles
+        self.level = game.level
+
+    def encode(self, game: SnakeGame, over: bool = False) -> bytes:
+        snakes = game.snakes()
+        scores = [snake.score for snake in snakes]
+        powers = [snake.power_up for snake in snakes]
+        flags = ((_FOOD if game.food != self.food else 0) |
+                 (_POWER_UP if game.power_up != self.power_up else 0) |
+                 (_OBSTACLES if game.obstacles is not self.obstacles else 0) |
+                 (_SCORES if scores != self.scores else 0) |
+                 (_POWERS if powers != self.powers else 0) |
+                 (_LEVEL if game.level != self.level else 0) |
+                 (_OVER if over else 0))
+        out = bytearray([DELTA])
+        _write_varint(out, game.ticks)
+        out.append(flags)
+        for i, snake in enumerate(snakes):
+            head = snake.body[0]
+            moved = _cell(game, head) if head != self.heads[i] else 0
+            _write_varint(out, moved << 1 | (len(snake.body) > self.lengths[i]))
+        if flags & _FOOD:
+            _write_varint(out, _cell(game, game.food))
+        if flags & _POWER_UP:
+            _write_varint(out, _cell(game, game.power_up))
+        if flags & _OBSTACLES:
+            _write_varint(out, len(game.obstacles))
+            for obs in game.obstacles:
+                _write_varint(out, _cell(game, obs))
+        if flags & _SCORES:
+            for score in scores:
+                _write_varint(out, score)
+        if flags & _POWERS:
+            for power in powers:
+                _write_varint(out, _power(power))
+        if flags & _LEVEL:
+            _write_varint(out, game.level)
+        self.sync(game)
+        return bytes(out)
+
+
+class ClientState:
+    """A client's copy of a room's game, rebuilt from WELCOME, FULL and DELTA messages."""
+    def __init__(self):
+        self.room = None
+        self.index = SPECTATOR
+        self.width = self.height = 0
+        self.ticks = 0
+        self.level = 1
+        self.food = None
+        self.power_up = None
+        self.obstacles: List[tuple] = []
+        self.bodies: List[deque] = []
+        self.scores: List[int] = []
+        self.powers: List[Optional[int]] = []
+        self.rounds = 0
+
+    def apply(self, message: bytes):
+        kind, pos = message[0], 1
+        def read():
+            nonlocal pos
+            value, pos = _read_varint(message, pos)
+            return value
+
+        if kind == WELCOME:
+            self.room = read()
+            self.index = message[pos]
+            self.width, self.height = struct.unpack_from("<HH", message, pos + 1)
+        elif kind == FULL:
+            self.ticks, self.level = read(), read()
+            self.food, self.power_up = _pos(self.width, read()), _pos(self.width, read())
+            self.obstacles = [_pos(self.width, read()) for _ in range(read())]
+            self.bodies, self.scores, self.powers = [], [], []
+            for _ in range(read()):
+                self.scores.append(read())
+                power = read()
+                self.powers.append(power - 1 if power else None)
+                self.bodies.append(deque(_pos(self.width, read()) for _ in range(read())))
+        elif kind == DELTA:
+            self.ticks = read()
+            flags = message[pos]
+            pos += 1
+            for body in self.bodies:
+                value = read()
+                if value >> 1:
+                    body.appendleft(_pos(self.width, value >> 1))
+                    if not value & 1:
+                        body.pop()
+            if flags & _FOOD:
+                self.food = _pos(self.width, read())
+            if flags & _POWER_UP:
+                self.power_up = _pos(self.width, read())
+            if flags & _OBSTACLES:
+                self.obstacles = [_pos(self.width, read()) for _ in range(read())]
+            if flags & _SCORES:
+                self.scores = [read() for _ in self.bodies]
+            if flags & _POWERS:
+                self.powers = [power - 1 if power else None for power in (read() for _ in self.bodies)]
+            if flags & _LEVEL:
+                self.level = read()
+            if flags & _OVER:
+                self.rounds += 1
+
+
+class Room:
+    """
+    One authoritative game and its connected clients. The first player steers
+    snake2 and a second one takes snake1 over from the AI; anyone else watches.
+    A finished round is reset straight away and resent in full.
+    """
+    def __init__(self, room_id: int, level: int = 1, seed: Optional[int] = None):
+        self.room_id = room_id
+        self.game = SnakeGame(seed=seed, level=level, is_multiplayer=True)
+        self.encoder = DeltaEncoder(self.game)
+        self.clients: Dict[asyncio.StreamWriter, int] = {}
+        self.next_tick = 0.0
+
+    def _apply_controls(self):
+        players = set(self.clients.values())
+        self.game.snake1.controls = "remote" if 0 in players else "ai"
+        self.game.snake2.controls = "remote"
+
+    def join(self, writer: asyncio.StreamWriter) -> int:
+        taken = set(self.clients.values())
+        index = next((i for i in (1, 0) if i not in taken), SPECTATOR)
+        self.clients[writer] = index
+        self._apply_controls()
+        writer.write(frame(bytes([WELCOME]) + _varint(self.room_id) + bytes([index]) +
+                           struct.pack("<HH", self.game.width, self.game.height)))
+        writer.write(frame(encode_full(self.game)))
+        return index
+
+    def leave(self, writer: asyncio.StreamWriter):
+        self.clients.pop(writer, None)
+        self._apply_controls()
+
+    def input(self, writer: asyncio.StreamWriter, code: int):
+        index = self.clients.get(writer, SPECTATOR)
+        if index != SPECTATOR and code < len(DIRECTIONS):
+            self.game.snakes()[index].queue_turn(DIRECTIONS[code])
+
+    def step(self) -> int:
+        """Advance one tick and broadcast it; returns the bytes queued per client."""
+        game = self.game
+        over = game.move()
+        game.events.clear()
+        data = frame(self.encoder.encode(game, over))
+        if over:
+            # SnakeGame.reset goes back to the level the room was created with
+            game.reset()
+            self._apply_controls()
+            self.encoder.sync(game)
+            data += frame(encode_full(game))
+        self.broadcast(data)
+        return len(data)
+
+    def broadcast(self, data: bytes):
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                # Too slow to keep up: drop it instead of letting its backlog grow
+                self.leave(writer)
+                writer.close()
+            else:
+                writer.write(data)
+
+
+class GameServer:
+    """
+    Runs any number of rooms in one process. A single loop ticks every room that
+    is due (at its level speed, or `tick_rate` if given) and never waits on a
+    client, so a tick costs the simulation plus one encode per room.
+    """
+    def __init__(self, tick_rate: Optional[float] = None, level: int = 1):
+        self.tick_rate = tick_rate
+        self.level = level
+        self.rooms: Dict[int, Room] = {}
+        self.tick_times = deque(maxlen=10000)
+        self.bytes_sent = 0
+        self.ticks = 0
+        self._server = None
+        self._ticker = None
+
+    def room(self, room_id: int) -> Room:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = Room(room_id, self.level)
+            room.next_tick = asyncio.get_running_loop().time()
+        return room
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        room = None
+        try:
+            while True:
+                length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                message = await reader.readexactly(length)
+                if not message:
+                    continue
+                if message[0] == JOIN and room is None:
+                    room = self.room(_read_varint(message, 1)[0])
+                    room.join(writer)
+                elif message[0] == INPUT and room is not None and len(message) > 1:
+                    room.input(writer, message[1])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            log.error("server", "Error in client handler", error=e)
+        finally:
+            if room is not None:
+                room.leave(writer)
+                if not room.clients:
+                    self.rooms.pop(room.room_id, None)
+            writer.close()
+
+    async def tick_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            wake = start + 0.1
+            for room in list(self.rooms.values()):
+                interval = 1 / (self.tick_rate or room.game.speed)
+                if room.next_tick <= start:
+                    try:
+                        self.bytes_sent += room.step() * len(room.clients)
+                        self.ticks += 1
+                    except Exception as e:
+                        log.error("server", "Error in room", room=room.room_id, error=e)
+                    # Skip ticks rather than bursting to catch up after a stall
+                    room.next_tick = max(room.next_tick + interval, start)
+                wake = min(wake, room.next_tick)
+            self.tick_times.append(loop.time() - start)
+            await asyncio.sleep(max(0.0, wake - loop.time()))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening and ticking; returns the bound port."""
+        self._server = await asyncio.start_server(self.handle, host, port)
+        self._ticker = asyncio.ensure_future(self.tick_loop())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        """Milliseconds spent per pass of the tick loop."""
+        times = sorted(self.tick_times)
+        if not times:
+            return {}
+        stats = {f"p{q}": times[min(len(times) - 1, len(times) * q // 100)] * 1000 for q in (50, 95, 99)}
+        stats["max"] = times[-1] * 1000
+        return stats
+
+
+async def run_bot(host: str, port: int, room_id: int, duration: float, seed: Optional[int] = None) -> ClientState:
+    """
+    A scripted client: joins `room_id`, mirrors the game from the server's
+    messages and, if it got a snake, steers toward the food with some noise.
+    """
+    rng = random.Random(seed)
+    state = ClientState()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(frame(bytes([JOIN]) + _varint(room_id)))
+    direction = RIGHT
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            try:
+                length, = _LENGTH.unpack(await asyncio.wait_for(reader.readexactly(_LENGTH.size),
+                                                                deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            message = await reader.readexactly(length)
+            state.apply(message)
+            if message[0] != DELTA or state.index == SPECTATOR or state.food is None:
+                continue
+            head = state.bodies[state.index][0]
+            dx, dy = state.food[0] - head[0], state.food[1] - head[1]
+            want = (RIGHT if dx > 0 else LEFT) if dx and (not dy or rng.random() < 0.5) else (DOWN if dy > 0 else UP)
+            if rng.random() < 0.1:
+                want = rng.choice(DIRECTIONS)
+            if want != direction and want != (-direction[0], -direction[1]):
+                direction = want
+                writer.write(frame(bytes([INPUT, _DIRECTION_CODES[want]])))
+    finally:
+        writer.close()
+    return state
+
+
+def _in_sync(state: ClientState, game: SnakeGame) -> bool:
+    return (state.ticks == game.ticks and state.food == game.food and state.power_up == game.power_up and
+            state.obstacles == list(game.obstacles) and state.level == game.level and
+            state.scores == [snake.score for snake in game.snakes()] and
+            state.powers == [snake.power_up for snake in game.snakes()] and
+            [list(body) for body in state.bodies] == [list(snake.body) for snake in game.snakes()])
+
+
+async def _load_test(rooms: int, bots: int, seconds: float, tick_rate: Optional[float]) -> int:
+    server = GameServer(tick_rate)
+    port = await server.start()
+    started = time.perf_counter()
+    clients = [asyncio.ensure_future(run_bot("127.0.0.1", port, room, seconds + 1, room * bots + i))
+               for room in range(rooms) for i in range(bots)]
+    # Stop ticking a second before the bots leave, so every mirror can be checked against its room
+    await asyncio.sleep(seconds)
+    server._ticker.cancel()
+    elapsed = time.perf_counter() - started
+    games = {room_id: room.game for room_id, room in server.rooms.items()}
+    states = await asyncio.gather(*clients, return_exceptions=True)
+    await server.stop()
+
+    failed = [s for s in states if isinstance(s, BaseException)]
+    mirrors = [s for s in states if isinstance(s, ClientState)]
+    stale = sum(1 for s in mirrors if s.room not in games or not _in_sync(s, games[s.room]))
+    rounds = sum(s.rounds for s in mirrors)
+    print(f"{rooms} rooms x {bots} bots for {elapsed:.1f}s: {server.ticks} room ticks "
+          f"({server.ticks / elapsed:.0f}/s), {rounds} rounds seen, {len(failed)} clients failed, "
+          f"{stale} out of sync")
+    if server.ticks:
+        print(f"  {server.bytes_sent / max(1, server.ticks * bots):.1f} bytes per client per tick")
+    print("  tick loop ms: " + ", ".join(f"{k} {v:.2f}" for k, v in server.latency_percentiles().items()))
+    for e in failed[:3]:
+        print(f"  client error: {e!r}")
+    return 1 if failed or stale else 0
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Authoritative Snake server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run a server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=7777)
+    serve.add_argument("--level", type=int, default=1)
+    serve.add_argument("--tick-rate", type=float, help="fixed ticks per second (default: level speed)")
+    load = sub.add_parser("load", help="drive a local server with scripted bots")
+    load.add_argument("--rooms", type=int, default=100)
+    load.add_argument("--bots", type=int, default=2, help="clients per room")
+    load.add_argument("--seconds", type=float, default=10.0)
+    load.add_argument("--tick-rate", type=float)
+    args = parser.parse_args(argv)
+
+    if args.command == "load":
+        return asyncio.run(_load_test(args.rooms, args.bots, args.seconds, args.tick_rate))
+
+    async def serve_forever():
+        server = GameServer(args.tick_rate, args.level)
+        port = await server.start(args.host, args.port)
+        print(f"Serving on {args.host}:{port}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
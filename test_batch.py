@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from batch import ACTIONS, BatchSnakeGame
+from engine import GHOST, SnakeGame
+
+WIDTH, HEIGHT = 12, 10
+
+
+def _state(game: SnakeGame):
+    snake = game.snake1
+    return ([y * WIDTH + x for x, y in snake.body], snake.score, game.level, game.food, game.power_up, game.ticks)
+
+
+def _batch_state(games: BatchSnakeGame, g: int):
+    return (games.body_cells(g).tolist(), int(games.score[g]), int(games.level[g]), games._pos(int(games.food[g])),
+            games._pos(int(games.power_up[g])), int(games.ticks[g]))
+
+
+@pytest.mark.parametrize("level", [1, 3])
+def test_batch_matches_engine(level):
+    """Every batched game plays tick for tick like its scalar engine game, resets and power-ups included."""
+    n = 8
+    games = BatchSnakeGame(n, WIDTH, HEIGHT, seeds=range(n), level=level)
+    scalar = [SnakeGame(WIDTH, HEIGHT, seed=seed, level=level) for seed in range(n)]
+    rng = random.Random(5)
+    resets = 0
+    for tick in range(1500):
+        actions = []
+        for g, game in enumerate(scalar):
+            snake = game.snake1
+            # Mostly the planner, so snakes grow and level up, with random moves for variety
+            direction = snake.ai_move(game) if rng.random() < 0.9 else ACTIONS[rng.randrange(4)]
+            if tick % 97 == g:
+                snake.give_power_up(GHOST, game)
+                games._set_power(g, GHOST)
+                games.power_timer[g] = snake.power_up_timer
+            actions.append(ACTIONS.index(direction))
+        _, _, dones = games.step(actions)
+        for g, game in enumerate(scalar):
+            game.snake1.direction = ACTIONS[actions[g]]
+            over = game.move()
+            assert bool(over) == bool(dones[g]), (tick, g)
+            if over:
+                game.reset()
+                resets += 1
+                assert game.level == level and games.level[g] == level
+            assert _batch_state(games, g) == _state(game), (tick, g)
+    assert resets > 0
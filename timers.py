@@ -0,0 +1,75 @@
+from typing import Callable, List
+
+
+class Timer:
+    """A scheduled callback; `cancel` it to stop it firing (again, for repeating timers)."""
+    __slots__ = ("due", "interval", "callback", "args", "cancelled")
+
+    def __init__(self, due: int, interval: int, callback: Callable, args: tuple):
+        self.due = due
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Callbacks due on integer ticks, kept in a hashed timing wheel: a timer waits
+    in slot `due % slots`, and each tick only looks at its own slot, so pending
+    timers cost nothing until they come due. Timers more than one revolution out
+    stay in their slot until their tick comes round.
+
+    Time only passes when `advance` is called, so whatever the wheel drives stops
+    when its owner stops ticking it (paused) and runs the same on every replay.
+    Timers due on the same tick fire in the order they were scheduled.
+    """
+    def __init__(self, now: int = 0, slots: int = 64):
+        self.now = now
+        self._slots: List[List[Timer]] = [[] for _ in range(slots)]
+
+    def at(self, tick: int, callback: Callable, *args) -> Timer:
+        """Call `callback(*args)` on `tick`, or on the next tick if that has passed."""
+        return self._add(Timer(max(tick, self.now + 1), 0, callback, args))
+
+    def schedule(self, delay: int, callback: Callable, *args) -> Timer:
+        """Call `callback(*args)` `delay` ticks from now (at least one)."""
+        return self.at(self.now + delay, callback, *args)
+
+    def every(self, interval: int, callback: Callable, *args) -> Timer:
+        """Call `callback(*args)` every `interval` ticks, starting `interval` ticks from now."""
+        return self._add(Timer(self.now + max(1, interval), max(1, interval), callback, args))
+
+    def _add(self, timer: Timer) -> Timer:
+        self._slots[timer.due % len(self._slots)].append(timer)
+        return timer
+
+    def pending(self) -> int:
+        return sum(not timer.cancelled for slot in self._slots for timer in slot)
+
+    def advance(self, ticks: int = 1) -> int:
+        """Move time forward `ticks` ticks, firing what comes due; returns how many fired."""
+        fired = 0
+        for _ in range(ticks):
+            self.now += 1
+            index = self.now % len(self._slots)
+            slot = self._slots[index]
+            if not slot:
+                continue
+            due = [timer for timer in slot if timer.due == self.now]
+            if not due:
+                continue
+            # Callbacks may schedule into this slot, so it is replaced before they run
+            self._slots[index] = [timer for timer in slot if timer.due != self.now and not timer.cancelled]
+            for timer in due:
+                if timer.cancelled:
+                    continue
+                timer.callback(*timer.args)
+                fired += 1
+                if timer.interval and not timer.cancelled:
+                    timer.due += timer.interval
+                    self._add(timer)
+        return fired
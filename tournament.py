@@ -0,0 +1,203 @@
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from engine import GRID_WIDTH, GRID_HEIGHT, SnakeGame
+from policies import POLICIES, make_policy
+
+# Matches still going after this many ticks go to the higher score
+MAX_TICKS = 5000
+
+# Seeds per task handed to a worker
+CHUNK = 8
+
+# Two-sided 95% normal quantile for the confidence intervals
+Z = 1.96
+
+
+class Result(NamedTuple):
+    """One match from the contestants' point of view: index 0 is the first policy named, whichever snake it steered."""
+    seed: int
+    swapped: bool
+    winner: Optional[int]
+    scores: Tuple[int, int]
+    lengths: Tuple[int, int]
+    deaths: Tuple[Optional[str], Optional[str]]
+    ticks: int
+    level: int
+
+
+def play_match(seed: int, policies: Sequence[str], width: int = GRID_WIDTH, height: int = GRID_HEIGHT,
+               level: int = 1, max_ticks: int = MAX_TICKS, swapped: bool = False) -> Result:
+    """
+    Play one seeded match between two policies. Normally policies[0] steers snake1;
+    `swapped` gives it snake2 instead. The last snake alive wins; heads meeting or
+    dying together is a draw, and at `max_ticks` (or a full board) the higher score wins.
+    """
+    sides = list(reversed(policies)) if swapped else list(policies)
+    game = SnakeGame(width, height, seed=seed, level=level, controls=sides)
+    steer = [make_policy(name, seed * 2 + i) for i, name in enumerate(sides)]
+    snakes = game.snakes()
+    while True:
+        for snake, choose in zip(snakes, steer):
+            if snake.death is None:
+                snake.direction = choose(game, snake)
+        if game.move() or game.ticks >= max_ticks:
+            break
+    alive = [i for i, snake in enumerate(snakes) if snake.death is None]
+    if len(alive) == 1:
+        winner = alive[0]
+    elif not alive or snakes[0].score == snakes[1].score:
+        winner = None
+    else:
+        winner = 0 if snakes[0].score > snakes[1].score else 1
+    order = (1, 0) if swapped else (0, 1)
+    return Result(seed, swapped, None if winner is None else order.index(winner),
+                  tuple(snakes[i].score for i in order), tuple(len(snakes[i].body) for i in order),
+                  tuple(snakes[i].death for i in order), game.ticks, game.level)
+
+
+def _play(task) -> List[Result]:
+    # Runs in a pool worker: every match for one chunk of seeds
+    seeds, policies, options = task
+    results = []
+    for seed in seeds:
+        for swapped in ((False, True) if options["swap"] else (False,)):
+            results.append(play_match(seed, policies, options["width"], options["height"], options["level"],
+                                      options["max_ticks"], swapped))
+    return results
+
+
+def run(policies: Sequence[str], seeds: Sequence[int], workers: int = 1, width: int = GRID_WIDTH,
+        height: int = GRID_HEIGHT, level: int = 1, max_ticks: int = MAX_TICKS, swap: bool = True,
+        chunk: int = CHUNK) -> List[Result]:
+    """
+    Every match for `seeds` (each seed from both sides when `swap` is set) across
+    `workers` processes, in seed order. Seeds are handed out in chunks as workers
+    free up, and only the small Result tuples come back.
+    """
+    for name in policies:
+        make_policy(name)
+    options = {"width": width, "height": height, "level": level, "max_ticks": max_ticks, "swap": swap}
+    seeds = list(seeds)
+    tasks = [(seeds[i:i + chunk], tuple(policies), options) for i in range(0, len(seeds), chunk)]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            chunks = list(pool.imap_unordered(_play, tasks))
+    else:
+        chunks = [_play(task) for task in tasks]
+    return sorted((result for results in chunks for result in results), key=lambda r: (r.seed, r.swapped))
+
+
+def wilson(successes: float, n: int, z: float = Z) -> Tuple[float, float]:
+    """Wilson score interval for a proportion; (0, 1) when there are no trials."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def mean_interval(values: Sequence[float], z: float = Z) -> Tuple[float, float]:
+    """Mean and the half-width of its normal-approximation confidence interval."""
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    mean = sum(values) / n
+    if n == 1:
+        return mean, 0.0
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, z * math.sqrt(variance / n)
+
+
+def summarise(policies: Sequence[str], results: Sequence[Result]) -> Dict[str, object]:
+    """Win and draw rates with intervals, score/length means with intervals, and deaths by cause."""
+    n = len(results)
+    contestants = []
+    for i, name in enumerate(policies):
+        wins = sum(r.winner == i for r in results)
+        contestants.append({
+            "policy": name,
+            "wins": wins,
+            "win_rate": wins / n if n else 0.0,
+            "win_interval": wilson(wins, n),
+            "score": mean_interval([r.scores[i] for r in results]),
+            "length": mean_interval([r.lengths[i] for r in results]),
+            "deaths": dict(Counter(r.deaths[i] or "survived" for r in results)),
+        })
+    draws = sum(r.winner is None for r in results)
+    return {"matches": n, "draws": draws, "draw_interval": wilson(draws, n),
+            "ticks": mean_interval([r.ticks for r in results]), "contestants": contestants}
+
+
+def record(results: Iterable[Result], policies: Sequence[str], path: str, level: int = 1):
+    """Add every snake of every match to a scores.py leaderboard as mode "tournament", with its policy."""
+    from scores import Run, ScoreStore
+    store = ScoreStore(path)
+    try:
+        now = time.time()
+        for r in results:
+            for i, name in enumerate(policies):
+                player = i ^ r.swapped
+                store.record(Run("tournament", "ai", player, level, r.level, r.scores[i], r.lengths[i], r.ticks,
+                                 r.seed, r.deaths[i], now, name))
+        store.flush()
+    finally:
+        store.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Headless AI-vs-AI Snake tournaments")
+    parser.add_argument("snake1", nargs="?", default="planner", help=f"{', '.join(POLICIES)} or module:factory")
+    parser.add_argument("snake2", nargs="?", default="greedy")
+    parser.add_argument("--matches", type=int, default=100, help="seeds to play (twice each unless --no-swap)")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--width", type=int, default=GRID_WIDTH)
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--no-swap", action="store_true", help="keep each policy on its own snake")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="seeds per task")
+    parser.add_argument("--db", help="also record every snake to this leaderboard")
+    args = parser.parse_args(argv)
+
+    policies = (args.snake1, args.snake2)
+    try:
+        for name in policies:
+            make_policy(name)
+    except (ValueError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    results = run(policies, range(args.seed, args.seed + args.matches), args.workers, args.width, args.height,
+                  args.level, args.max_ticks, not args.no_swap, args.chunk)
+    elapsed = time.perf_counter() - start
+    summary = summarise(policies, results)
+
+    ticks, ticks_ci = summary["ticks"]
+    print(f"{args.snake1} vs {args.snake2}: {summary['matches']} matches on {args.width}x{args.height}, "
+          f"level {args.level}, {args.workers} workers, {summary['matches'] / elapsed:.1f} matches/s")
+    print(f"{'policy':<16}{'wins (95% CI)':<26}{'score':<20}{'length':<18}deaths")
+    for c in summary["contestants"]:
+        low, high = c["win_interval"]
+        score, score_ci = c["score"]
+        length, length_ci = c["length"]
+        deaths = ", ".join(f"{cause} {count}" for cause, count in sorted(c["deaths"].items()))
+        print(f"{c['policy']:<16}{c['wins']:>4} {c['win_rate']:6.1%} [{low:.1%}, {high:.1%}]  "
+              f"{score:8.1f} ± {score_ci:<7.1f} {length:7.1f} ± {length_ci:<6.1f} {deaths}")
+    low, high = summary["draw_interval"]
+    print(f"{'draws':<16}{summary['draws']:>4} [{low:.1%}, {high:.1%}], mean length {ticks:.0f} ± {ticks_ci:.0f} ticks")
+
+    if args.db:
+        record(results, policies, args.db, args.level)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))